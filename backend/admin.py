@@ -1,6 +1,112 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 # Register your models here.
 from .models import Chat, User, Listing, Category, Image
 
-admin.site.register([User, Listing, Category, Image, Chat])
+
+class EstimatedCountPaginator(Paginator):
+    '''
+    Paginator that doesn't COUNT(*) the big tables: for an unfiltered change
+    list on Postgres it uses the planner's row estimate when that is above
+    `threshold`. Filtered lists and small tables are counted exactly.
+    '''
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class PerformantAdmin(admin.ModelAdmin):
+    '''
+    Base admin of the big tables. Change lists run a fixed number of queries
+    whatever the page size:
+    - list_select_related joins what list_display (and __str__) follow
+    - no full result count, estimated counts (EstimatedCountPaginator)
+    - raw id widgets instead of <select>s listing every related row
+    - search_fields are matched by prefix (case sensitive), or by id for
+      numbers, so the searches use the indexes (db_index=True creates the
+      LIKE 'prefix%' index too on Postgres)
+    '''
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    list_per_page = 50
+    ordering = ('-id',)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term or not self.search_fields:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        matches = queryset.none()
+        for field in self.search_fields:
+            matches = matches | queryset.filter(**{f'{field}__startswith': search_term})
+        return matches, False
+
+
+class SoftDeleteAdmin(PerformantAdmin):
+    # deleted rows are listed too, they can be filtered on deleted_at
+    list_filter = (('deleted_at', admin.EmptyFieldListFilter),)
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+@admin.register(User)
+class UserAdmin(SoftDeleteAdmin):
+    list_display = ('id', 'email', 'first_name', 'last_name', 'university', 'deleted_at')
+    search_fields = ('email',)
+    readonly_fields = ('password',)
+
+
+@admin.register(Listing)
+class ListingAdmin(SoftDeleteAdmin):
+    list_display = ('id', 'item_name', 'price', 'sold', 'user', 'date_created', 'deleted_at')
+    list_select_related = ('user',)
+    search_fields = ('item_name',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Category)
+class CategoryAdmin(PerformantAdmin):
+    list_display = ('id', 'category_name', 'listing')
+    list_select_related = ('listing__user',)
+    search_fields = ('category_name',)
+    raw_id_fields = ('listing',)
+
+
+@admin.register(Image)
+class ImageAdmin(PerformantAdmin):
+    list_display = ('id', 'image_url', 'listing')
+    list_select_related = ('listing__user',)
+    search_fields = ('image_url',)
+    raw_id_fields = ('listing',)
+
+
+@admin.register(Chat)
+class ChatAdmin(PerformantAdmin):
+    list_display = ('id', 'chat_id')
+    search_fields = ('chat_id',)
+    raw_id_fields = ('users',)
@@ -0,0 +1,174 @@
+'''
+Archival of sold listings.
+
+archive() moves sold listings older than a cutoff, with their images and
+categories, from the live tables to ArchivedListing / ArchivedImage /
+ArchivedCategory. It works in batches of ids, each moved in its own
+transaction, so it can be stopped at any time and simply run again to resume.
+
+archived_listings() and MergedListings let resolve_listings serve archived
+rows transparently.
+'''
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Value
+from django.utils import timezone
+
+from .models import ArchivedCategory, ArchivedImage, ArchivedListing, Category, Image, Listing
+
+# Tables covered by the size report
+TABLES = (Listing, Image, Category, ArchivedListing, ArchivedImage, ArchivedCategory)
+
+
+def archivable(older_than_days):
+    ''' Sold listings created more than `older_than_days` days ago. '''
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Listing.objects.filter(sold=True, date_created__lt=cutoff)
+
+
+def archive_batch(ids):
+    ''' Move the given listings to the archive tables in one transaction. Returns how many moved. '''
+    with transaction.atomic():
+        # lock the rows and re-check them, they may have changed since the ids were read
+        listings = list(Listing.objects.select_for_update().filter(pk__in=ids, sold=True))
+        ids = [listing.pk for listing in listings]
+        if not ids:
+            return 0
+
+        ArchivedListing.objects.bulk_create([
+            ArchivedListing(
+                id=listing.id,
+                item_name=listing.item_name,
+                price=listing.price,
+                negotiable=listing.negotiable,
+                condition=listing.condition,
+                description=listing.description,
+                location=listing.location,
+                date_created=listing.date_created,
+                sold=listing.sold,
+                user_id=listing.user_id,
+            )
+            for listing in listings
+        ])
+        ArchivedImage.objects.bulk_create([
+            ArchivedImage(image_url=image_url, listing_id=listing_id)
+            for image_url, listing_id in Image.objects.filter(listing__in=ids).values_list('image_url', 'listing_id')
+        ])
+        ArchivedCategory.objects.bulk_create([
+            ArchivedCategory(category_name=category_name, listing_id=listing_id)
+            for category_name, listing_id in Category.objects.filter(listing__in=ids).values_list('category_name', 'listing_id')
+        ])
+
+        Image.objects.filter(listing__in=ids).delete()
+        Category.objects.filter(listing__in=ids).delete()
+        Listing.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive(older_than_days=90, batch_size=500, max_batches=None, pause=0.0, log=None):
+    '''
+    Archive every archivable listing, batch_size at a time, sleeping `pause`
+    seconds between batches to leave room for the live traffic.
+    Returns the number of listings archived.
+    '''
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(archivable(older_than_days).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        moved = archive_batch(ids)
+        archived += moved
+        batches += 1
+        if log:
+            log(f"batch {batches}: archived {moved} listings (up to id {ids[-1]})")
+        if pause:
+            time.sleep(pause)
+    return archived
+
+
+def table_report():
+    '''
+    Row count of the live and archive tables, and their size on disk in bytes
+    (Postgres only, None elsewhere).
+    '''
+    report = []
+    for model in TABLES:
+        table = model._meta.db_table
+        size = None
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+                size = cursor.fetchone()[0]
+        report.append((table, model.objects.count(), size))
+    return report
+
+
+def archived_listings(item_name=None, max_price=None, min_price=None, negotiable=None, condition=None,
+                      location=None, date_created=None, created_after=None, user_id=None, university=None,
+                      categories=None, user_email=None):
+    ''' Archived listings matching the same filters as resolve_listings. '''
+    archived = ArchivedListing.objects.filter(user__deleted_at__isnull=True)
+    if item_name is not None:
+        archived = archived.filter(item_name__icontains=item_name)
+    if max_price is not None:
+        archived = archived.filter(price__lte=max_price)
+    if min_price is not None:
+        archived = archived.filter(price__gte=min_price)
+    if negotiable is True:
+        archived = archived.filter(negotiable=negotiable)
+    if condition is not None:
+        archived = archived.filter(condition=condition)
+    if location is not None:
+        archived = archived.filter(location=location)
+    if date_created is not None:
+        archived = archived.filter(date_created=date_created)
+    if created_after is not None:
+        archived = archived.filter(date_created__gte=created_after)
+    if user_id is not None:
+        archived = archived.filter(user__id=user_id)
+    if university is not None:
+        archived = archived.filter(user__university__icontains=university)
+    if categories:
+        archived = archived.filter(categories__category_name__in=categories)
+    if user_email is not None:
+        archived = archived.filter(user__email=user_email)
+    return archived.distinct()
+
+
+class MergedListings:
+    '''
+    Live and archived listings, newest first, as one lazy sequence. The
+    ordering and any slice run in SQL (a UNION ALL of the ids, ORDER BY
+    date_created, LIMIT / OFFSET), and only the listings of the slice are
+    loaded, as Listing instances.
+    '''
+
+    def __init__(self, live, archived):
+        self.live = live
+        self.archived = archived
+
+    def keys(self):
+        live = self.live.order_by().annotate(archived=Value(False, output_field=BooleanField()))
+        archived = self.archived.order_by().annotate(archived=Value(True, output_field=BooleanField()))
+        return (
+            live.values_list('id', 'date_created', 'archived')
+                .union(archived.values_list('id', 'date_created', 'archived'), all=True)
+                .order_by('-date_created', '-id')
+        )
+
+    def __getitem__(self, item):
+        keys = list(self.keys()[item])
+        live = Listing.objects.in_bulk([pk for pk, date_created, archived in keys if not archived])
+        archived = ArchivedListing.objects.prefetch_related('images', 'categories').in_bulk(
+            [pk for pk, date_created, archived in keys if archived]
+        )
+        return [archived[pk].as_listing() if is_archived else live[pk] for pk, date_created, is_archived in keys]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __len__(self):
+        return self.keys().count()
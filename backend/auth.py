@@ -0,0 +1,85 @@
+'''
+Stateless token authentication for the API.
+
+A token is the signed (with SECRET_KEY, see django.core.signing) id of a
+backend.models.User and the time it was issued:
+
+    Authorization: Bearer <token>
+
+It is verified locally (middleware.TokenAuthenticationMiddleware), without a
+database lookup, so authenticating a request costs no query at all. The user
+row itself is only loaded when a resolver calls request_user(), once per
+request. It is not cached across requests: a cache shared by the workers
+would cost a query as well, and a per-process one would serve users changed
+or deleted through another worker. Tokens carry a digest of the password
+hash, so changing the password logs out every token issued before.
+'''
+from django.conf import settings
+from django.core import signing
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import User
+
+SALT = 'backend.auth'
+# default lifetime of a token, in seconds (settings.AUTH_TOKEN_MAX_AGE)
+TOKEN_MAX_AGE = 7 * 24 * 3600
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def password_key(user) -> str:
+    ''' Short digest of the user's password hash: changing the password invalidates the tokens. '''
+    return salted_hmac(SALT, user.password).hexdigest()[:16]
+
+
+def create_token(user) -> str:
+    ''' Signed token identifying `user`. '''
+    return signing.dumps({'uid': user.pk, 'pw': password_key(user)}, salt=SALT)
+
+
+def read_token(token) -> dict:
+    '''
+    The payload of a token: the user id ('uid') and the password_key() it
+    was issued for ('pw'). Raises InvalidToken if it is forged or expired.
+    '''
+    max_age = getattr(settings, 'AUTH_TOKEN_MAX_AGE', TOKEN_MAX_AGE)
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise InvalidToken("Token expired, log in again.")
+    except signing.BadSignature:
+        raise InvalidToken("Invalid token.")
+    return payload
+
+
+def get_user(user_id):
+    ''' The (live) user with that id, None if there is none. '''
+    return User.objects.filter(pk=user_id).first()
+
+
+def request_user(request):
+    '''
+    The user authenticated by the token of a request, None for anonymous
+    requests and for tokens issued before the user's password changed.
+    '''
+    user_id = getattr(request, 'cbay_user_id', None)
+    if user_id is None:
+        return None
+    # loaded once per request, however many resolvers ask for it
+    if not hasattr(request, '_cbay_user'):
+        user = get_user(user_id)
+        if user is not None and not constant_time_compare(password_key(user), getattr(request, 'cbay_password_key', None) or ''):
+            user = None
+        request._cbay_user = user
+    return request._cbay_user
+
+
+def get_token(request):
+    ''' The bearer token of a request, None if it has none. '''
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
@@ -0,0 +1,86 @@
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import F
+from graphql import parse
+from graphql.error import GraphQLError
+from graphql.language import ast
+
+from .models import DataVersion
+
+# Name of the DataVersion row shared by all GraphQL data
+DATA_VERSION = 'graphql'
+# Version of the view statistics (see viewtracking.py), bumped by every flush.
+# Only the ETags of the queries selecting VIEW_STATS_FIELDS depend on it, so
+# the flushes don't invalidate the other cached responses.
+VIEW_STATS_VERSION = 'viewstats'
+VIEW_STATS_FIELDS = frozenset({'trendingListings', 'recentlyViewed'})
+
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+
+def get_data_version(name=DATA_VERSION) -> int:
+    ''' Current data version (0 until the first mutation). '''
+    version = DataVersion.objects.filter(name=name).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_data_version(name=DATA_VERSION):
+    '''
+    Invalidate every ETag handed out so far. Called by the mutations after
+    they change data that queries can return.
+    '''
+    updated = DataVersion.objects.filter(name=name).update(version=F('version') + 1)
+    if not updated:
+        DataVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+@lru_cache(maxsize=512)
+def uses_view_stats(query) -> bool:
+    ''' Whether a GraphQL document selects one of VIEW_STATS_FIELDS (anywhere, fragments included). '''
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return False
+    pending = [definition.selection_set for definition in document.definitions
+               if isinstance(definition, (ast.OperationDefinition, ast.FragmentDefinition))]
+    while pending:
+        selection_set = pending.pop()
+        for selection in selection_set.selections if selection_set else []:
+            if isinstance(selection, ast.Field) and selection.name.value in VIEW_STATS_FIELDS:
+                return True
+            pending.append(getattr(selection, 'selection_set', None))
+    return False
+
+
+def compute_etag(version, query, variables, operation_name, user_id=None) -> str:
+    '''
+    ETag of a GET query: the same query at the same data version (by the same
+    token user, as `me` depends on it) gets the same tag.
+    '''
+    key = [version, query, variables, operation_name]
+    if user_id is not None:
+        key.append(user_id)
+    key = json.dumps(key)
+    return '"' + hashlib.sha1(key.encode('utf-8')).hexdigest() + '"'
+
+
+def get_cache_control(operation_name) -> str:
+    '''
+    Cache-Control header for a GET query, configured per operation name with:
+
+        GRAPHQL_CACHE_CONTROL = {
+            'DEFAULT': 'no-cache',
+            'OPERATIONS': {'HomeFeed': 'public, max-age=30'},
+        }
+
+    The default `no-cache` lets browsers and CDNs keep the response but makes
+    them revalidate it (a cheap 304) before every use.
+    '''
+    config = getattr(settings, 'GRAPHQL_CACHE_CONTROL', {})
+    operations = config.get('OPERATIONS', {})
+    if operation_name in operations:
+        return operations[operation_name]
+    return config.get('DEFAULT', DEFAULT_CACHE_CONTROL)
@@ -0,0 +1,59 @@
+'''
+Optimistic locking for the update mutations.
+
+User and Listing rows carry a version number that every update increments.
+save_changes() writes only the changed columns with a single
+
+    UPDATE ... SET <changed columns>, version = version + 1 WHERE id = ? AND version = ?
+
+and raises ConflictError when no row matched, i.e. when someone else updated
+the row since the client read it. Without a version from the client the
+version check is left out and the changes apply on top of the current row.
+'''
+from django.db.models import F
+from graphql import GraphQLError
+
+
+class ConflictError(GraphQLError):
+    pass
+
+
+def save_changes(instance, changes, expected_version=None, force=False):
+    '''
+    Save `changes` (field name -> new value) to the row of `instance`.
+
+    expected_version is the version the client last saw, None skips the
+    version check (last write wins). Values equal to the current ones are skipped and
+    nothing is written when nothing changed, unless `force` is set (for
+    updates of related rows that should still bump the version).
+    Returns True if the row was written.
+    '''
+    changes = {field: value for field, value in changes.items() if getattr(instance, field) != value}
+    if not changes and not force:
+        if expected_version is not None and expected_version != instance.version:
+            raise conflict(instance, expected_version)
+        return False
+
+    rows = type(instance)._default_manager.filter(pk=instance.pk)
+    if expected_version is not None:
+        rows = rows.filter(version=expected_version)
+    updated = rows.update(version=F('version') + 1, **changes)
+    if not updated:
+        raise conflict(instance, expected_version)
+
+    for field, value in changes.items():
+        setattr(instance, field, value)
+    if expected_version is None:
+        # someone else may have bumped it since the mutation read the row
+        instance.refresh_from_db(fields=['version'])
+    else:
+        instance.version = expected_version + 1
+    return True
+
+
+def conflict(instance, expected_version):
+    name = type(instance).__name__
+    return ConflictError(
+        f"{name} {instance.pk} was modified by someone else (expected version {expected_version}). "
+        f"Reload it and try again."
+    )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from backend import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old sold listings (with their images and categories) to the archive tables. "
+        "Works in batches and can be interrupted and re-run at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=90,
+            help="Only archive listings created more than this many days ago (default: 90).")
+        parser.add_argument('--batch-size', type=int, default=500,
+            help="Listings moved per transaction (default: 500).")
+        parser.add_argument('--max-batches', type=int, default=None,
+            help="Stop after this many batches (default: run until done).")
+        parser.add_argument('--pause', type=float, default=0.0,
+            help="Seconds to sleep between batches (default: 0).")
+        parser.add_argument('--dry-run', action='store_true',
+            help="Only report how many listings would be archived.")
+
+    def handle(self, *args, **options):
+        self.write_report("Before")
+
+        pending = archive.archivable(options['older_than_days']).count()
+        if options['dry_run']:
+            self.stdout.write(f"{pending} listings would be archived")
+            return
+
+        archived = archive.archive(
+            older_than_days=options['older_than_days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(f"Archived {archived} of {pending} listings")
+        self.write_report("After")
+
+    def write_report(self, title):
+        self.stdout.write(f"{title}:")
+        for table, rows, size in archive.table_report():
+            size = '' if size is None else f" {size / 1024 / 1024:10.1f} MB"
+            self.stdout.write(f"  {table:<28} {rows:>10} rows{size}")
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar-listings table used by the recommendedListings query."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K,
+            help=f"Neighbors kept per listing (default: {recommendations.TOP_K}).")
+        parser.add_argument('--chunk-size', type=int, default=256,
+            help="Listings scored per NumPy batch, bounds memory use (default: 256).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = recommendations.rebuild(k=options['top_k'], chunk_size=options['chunk_size'])
+        self.stdout.write(f"Wrote {rows} neighbor rows in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from backend import purge
+
+
+class Command(BaseCommand):
+    help = "Hard delete soft-deleted listings and users in small batches. Safe to interrupt and re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, default=0,
+            help="Keep rows deleted less than this many seconds ago (default: 0).")
+        parser.add_argument('--batch-size', type=int, default=200,
+            help="Rows deleted per transaction (default: 200).")
+        parser.add_argument('--max-batches', type=int, default=None,
+            help="Stop after this many batches (default: run until done).")
+        parser.add_argument('--pause', type=float, default=0.0,
+            help="Seconds to sleep between batches (default: 0).")
+
+    def handle(self, *args, **options):
+        listings, users = purge.purge(
+            grace_seconds=options['grace_seconds'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(f"Purged {listings} listings and {users} users")
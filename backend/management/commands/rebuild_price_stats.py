@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from backend import pricestats
+
+
+class Command(BaseCommand):
+    help = "Recompute the price summaries used by the priceStats query from the Listing table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+            help="Listings loaded per query (default: 2000).")
+
+    def handle(self, *args, **options):
+        rows = pricestats.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(f"Wrote {rows} price summaries")
@@ -0,0 +1,45 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from backend import tasks
+
+
+class Command(BaseCommand):
+    help = "Run the background tasks queued by the mutations (the worker process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+            help="Tasks claimed at a time (default: 100).")
+        parser.add_argument('--sleep', type=float, default=1.0,
+            help="Seconds to wait when the queue is empty (default: 1).")
+        parser.add_argument('--once', action='store_true',
+            help="Exit when no task is due instead of waiting for more.")
+        parser.add_argument('--stats', action='store_true',
+            help="Print the queue depth and task latencies and exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        # finish the current batch on SIGTERM (Heroku restarts, deploys)
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        ran = tasks.work(
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            once=options['once'],
+            should_stop=lambda: bool(stopping),
+        )
+        self.stdout.write(f"Ran {ran} tasks")
+
+    def print_stats(self):
+        stats = tasks.stats()
+        self.stdout.write("Queue: " + ", ".join(f"{status} {count}" for status, count in stats['depth'].items()))
+        self.stdout.write(f"Oldest due task waiting for {stats['oldest_due_seconds']:.1f}s")
+        self.stdout.write("Finished in the last hour:")
+        for name, metrics in sorted(stats['finished'].items()):
+            self.stdout.write(
+                f"  {name}: {metrics['count']} tasks, waited {metrics['wait']:.2f}s, ran {metrics['run']:.3f}s on average"
+            )
@@ -0,0 +1,108 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def cpu_count() -> int:
+    ''' Number of CPUs this process may run on (respects container/affinity limits). '''
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    '''
+    Heroku (and most PaaS) set WEB_CONCURRENCY to the recommended number of
+    processes for the dyno size. Otherwise use gunicorn's usual 2 * cores + 1.
+    '''
+    concurrency = os.environ.get('WEB_CONCURRENCY')
+    if concurrency:
+        return max(1, int(concurrency))
+    return 2 * cpu_count() + 1
+
+
+def default_bind() -> str:
+    return f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the production server: a preforking gunicorn server over cbay.wsgi "
+        "(or cbay.asgi with --asgi) with DEBUG turned off."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default=default_bind(),
+            help="Address to listen on (default: 0.0.0.0:$PORT).")
+        parser.add_argument('--workers', type=int, default=None,
+            help="Number of worker processes (default: $WEB_CONCURRENCY or 2 * CPUs + 1).")
+        parser.add_argument('--threads', type=int, default=int(os.environ.get('GUNICORN_THREADS', 4)),
+            help="Threads per worker process for the WSGI server (default: $GUNICORN_THREADS or 4).")
+        parser.add_argument('--timeout', type=int, default=30,
+            help="Seconds before a silent worker is killed and restarted.")
+        parser.add_argument('--max-requests', type=int, default=1000,
+            help="Recycle a worker after this many requests (0 disables).")
+        parser.add_argument('--asgi', action='store_true',
+            help="Serve cbay.asgi with uvicorn workers instead of cbay.wsgi.")
+
+    def handle(self, *args, **options):
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            raise CommandError("gunicorn is not installed. Run `pip install -r requirements.txt`.")
+
+        # Never serve real traffic with DEBUG on: besides leaking tracebacks,
+        # DEBUG makes Django keep every SQL query in memory.
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on, turning it off for the production server.")
+            settings.DEBUG = False
+
+        workers = options['workers'] or default_workers()
+        config = {
+            'bind': options['bind'],
+            'workers': workers,
+            'timeout': options['timeout'],
+            'max_requests': options['max_requests'],
+            'max_requests_jitter': options['max_requests'] // 10,
+            'preload_app': True,
+            'accesslog': '-',
+        }
+        if options['asgi']:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError("--asgi needs uvicorn. Run `pip install uvicorn`.")
+            config['worker_class'] = 'uvicorn.workers.UvicornWorker'
+        else:
+            config['worker_class'] = 'gthread'
+            config['threads'] = options['threads']
+
+        asgi = options['asgi']
+
+        class Application(BaseApplication):
+            def load_config(self):
+                for key, value in config.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                # Runs once in the master before forking (preload_app), so the
+                # workers share the imported code and the built schema.
+                if asgi:
+                    from cbay.asgi import application
+                else:
+                    from cbay.wsgi import application
+                from cbay.schema import get_schema
+                get_schema()
+
+                # Don't let the children inherit the master's DB sockets
+                connections.close_all()
+                return application
+
+        self.stdout.write(
+            f"Serving {'cbay.asgi' if asgi else 'cbay.wsgi'} on {config['bind']} "
+            f"with {workers} workers" + ('' if asgi else f" x {config['threads']} threads")
+        )
+        Application().run()
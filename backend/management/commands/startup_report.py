@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cbay.startup import measure_startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how long a fresh process takes to start: Django setup, URLconf "
+        "import and GraphQL schema build, plus the slowest imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15,
+            help="How many packages and modules to list (default: 15).")
+        parser.add_argument('--budget', type=float, default=None,
+            help="Fail if the total startup time is above this many seconds.")
+
+    def handle(self, *args, **options):
+        report = measure_startup()
+        top = options['top']
+
+        self.stdout.write("Startup phases:")
+        for phase in ('django_setup', 'urlconf_import', 'schema_build', 'total'):
+            self.stdout.write(f"  {phase:<16} {report[phase] * 1000:8.1f} ms")
+        if report['schema_imported_by_urls']:
+            self.stdout.write(self.style.WARNING("  the URLconf imports backend.schema eagerly"))
+
+        self.stdout.write("\nSlowest packages (self import time):")
+        packages = sorted(report['packages'].items(), key=lambda item: item[1], reverse=True)
+        for package, seconds in packages[:top]:
+            self.stdout.write(f"  {package:<40} {seconds * 1000:8.1f} ms")
+
+        self.stdout.write("\nSlowest modules (cumulative import time):")
+        modules = sorted(report['modules'], key=lambda module: module[2], reverse=True)
+        for module, self_time, cumulative in modules[:top]:
+            self.stdout.write(f"  {module:<60} {cumulative * 1000:8.1f} ms")
+
+        budget = options['budget']
+        if budget is not None and report['total'] > budget:
+            raise CommandError(f"Startup took {report['total']:.2f}s, over the {budget:.2f}s budget.")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from backend import usage
+
+
+class Command(BaseCommand):
+    help = "Report the GraphQL operations, arguments and fields clients used (from the sampled requests)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+            help="Period covered by the report (default: 7 days).")
+        parser.add_argument('--top', type=int, default=20,
+            help="Number of operation signatures shown (default: 20).")
+        parser.add_argument('--type', action='append', dest='types',
+            help="Only report the fields of this type (repeatable, default: all types).")
+
+    def handle(self, *args, **options):
+        report = usage.report(options['days'])
+        sampled = sum(row[2] for row in report['operations'])
+        self.stdout.write(f"{sampled} sampled requests in the last {options['days']} days")
+
+        self.stdout.write("\nTop operations (name, root fields with their arguments):")
+        for operation_name, signature, count, ms, queries in report['operations'][:options['top']]:
+            self.stdout.write(
+                f"  {count:>7} {100 * count / sampled:5.1f}%  {ms:8.1f} ms  {queries:6.1f} SQL  "
+                f"{operation_name or '-'}  {signature}"
+            )
+
+        self.stdout.write("\nArguments per root field:")
+        for field, counts in sorted(report['arguments'].items()):
+            used = ', '.join(f"{name} {count}" for name, count in sorted(counts.items(), key=lambda item: -item[1]))
+            self.stdout.write(f"  {field}: {used or 'no arguments'}")
+
+        self.stdout.write("\nFields per type (0 = never selected):")
+        for type_name, counts in sorted(report['fields'].items()):
+            if options['types'] and type_name not in options['types']:
+                continue
+            self.stdout.write(f"  {type_name}")
+            for field, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+                self.stdout.write(f"    {count:>7}  {field}")
@@ -0,0 +1,87 @@
+'''
+Middleware for the API routes (settings.API_PATH_PREFIXES, i.e. /graphql/).
+
+The API doesn't use sessions, django.contrib.auth users or messages, so the
+Session / Authentication / Message middleware below are the Django ones
+except that they do nothing on API routes. The admin keeps working as before.
+API requests are authenticated with TokenAuthenticationMiddleware instead.
+'''
+import json
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware as BaseMessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from . import auth
+
+DEFAULT_API_PATH_PREFIXES = ('/graphql/',)
+
+
+def is_api_request(request) -> bool:
+    prefixes = getattr(settings, 'API_PATH_PREFIXES', DEFAULT_API_PATH_PREFIXES)
+    return request.path_info.startswith(tuple(prefixes))
+
+
+class SkipApiMixin:
+    ''' Run the middleware everywhere but on API routes. '''
+
+    def process_request(self, request):
+        if not is_api_request(request):
+            return super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_api_request(request):
+            return response
+        return super().process_response(request, response)
+
+
+class SessionMiddleware(SkipApiMixin, BaseSessionMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(BaseAuthenticationMiddleware):
+    # AuthenticationMiddleware has no process_response
+    def process_request(self, request):
+        if not is_api_request(request):
+            return super().process_request(request)
+
+
+class MessageMiddleware(SkipApiMixin, BaseMessageMiddleware):
+    pass
+
+
+class TokenAuthenticationMiddleware(MiddlewareMixin):
+    '''
+    Authenticate API requests with the bearer token (see auth.py). Sets
+    request.cbay_user_id, None for anonymous requests; resolvers get the
+    User itself with auth.request_user(request).
+    Requests with an invalid or expired token get a 401.
+    '''
+
+    def process_request(self, request):
+        if not is_api_request(request):
+            return None
+
+        request.cbay_user_id = None
+        token = auth.get_token(request)
+        if token is None:
+            return None
+
+        try:
+            payload = auth.read_token(token)
+        except auth.InvalidToken as error:
+            response = HttpResponse(
+                json.dumps({'errors': [{'message': str(error)}]}),
+                status=401,
+                content_type='application/json',
+            )
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+
+        request.cbay_user_id = payload['uid']
+        # checked against the user's current password by auth.request_user()
+        request.cbay_password_key = payload.get('pw')
+        return None
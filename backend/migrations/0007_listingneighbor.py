@@ -0,0 +1,31 @@
+# Generated by Django 3.1.7 on 2026-10-19 15:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingNeighbor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='backend.listing')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.listing')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listingneighbor',
+            index=models.Index(fields=['listing', '-score'], name='backend_lis_listing_a2a081_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='listingneighbor',
+            unique_together={('listing', 'neighbor')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.7 on 2026-10-19 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_listingneighbor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50)),
+                ('condition', models.CharField(max_length=50)),
+                ('university', models.CharField(max_length=50)),
+                ('sold', models.BooleanField(default=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('buckets', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name_plural': 'price summaries',
+                'unique_together': {('category', 'condition', 'university', 'sold')},
+            },
+        ),
+    ]
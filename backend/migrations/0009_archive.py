@@ -0,0 +1,49 @@
+# Generated by Django 3.1.7 on 2026-10-19 15:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_pricesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedListing',
+            fields=[
+                ('id', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('item_name', models.CharField(max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('negotiable', models.BooleanField()),
+                ('condition', models.CharField(max_length=50)),
+                ('description', models.CharField(max_length=5000, null=True)),
+                ('location', models.CharField(max_length=50)),
+                ('date_created', models.DateTimeField()),
+                ('sold', models.BooleanField(default=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='backend.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedImage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_url', models.URLField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='backend.archivedlisting')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedCategory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_name', models.CharField(max_length=50)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='categories', to='backend.archivedlisting')),
+            ],
+            options={
+                'verbose_name_plural': 'archived categories',
+            },
+        ),
+    ]
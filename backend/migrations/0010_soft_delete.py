@@ -0,0 +1,46 @@
+# Generated by Django 3.1.7 on 2026-10-19 15:55
+
+import backend.models
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0009_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254, validators=[django.core.validators.EmailValidator(), backend.models.User.validate_edu_email]),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['-date_created'], name='listing_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at'], name='listing_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(deleted_at__isnull=False), fields=['deleted_at'], name='user_deleted_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(deleted_at__isnull=True), fields=('email',), name='user_live_email_unique'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:01
+
+import backend.models
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='category_name',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='item_name',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254, validators=[django.core.validators.EmailValidator(), backend.models.User.validate_edu_email]),
+        ),
+    ]
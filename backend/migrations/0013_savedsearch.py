@@ -0,0 +1,65 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, default='', max_length=50)),
+                ('category', models.CharField(blank=True, max_length=50, null=True)),
+                ('university', models.CharField(blank=True, max_length=50, null=True)),
+                ('condition', models.CharField(blank=True, max_length=50, null=True)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to='backend.user')),
+            ],
+            options={
+                'verbose_name_plural': 'saved searches',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchMatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.listing')),
+                ('saved_search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='backend.savedsearch')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.user')),
+            ],
+            options={
+                'verbose_name_plural': 'search matches',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchmatch',
+            index=models.Index(condition=models.Q(delivered_at__isnull=True), fields=['user', 'created_at'], name='searchmatch_pending_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchmatch',
+            unique_together={('saved_search', 'listing')},
+        ),
+        migrations.AddIndex(
+            model_name='savedsearch',
+            index=models.Index(fields=['category'], name='backend_sav_categor_c1662a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedsearch',
+            index=models.Index(fields=['university'], name='backend_sav_univers_64d880_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedsearch',
+            index=models.Index(fields=['max_price'], name='backend_sav_max_pri_d20e81_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0014_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingStats',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='backend.listing')),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('trend', models.FloatField()),
+                ('university', models.CharField(blank=True, default='', max_length=50)),
+                ('last_viewed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'listing stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecentView',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('viewed_at', models.DateTimeField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.listing')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.user')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listingstats',
+            index=models.Index(fields=['university', '-trend'], name='backend_lis_univers_c6dc39_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingstats',
+            index=models.Index(fields=['-trend'], name='backend_lis_trend_f684a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recentview',
+            index=models.Index(fields=['user', '-viewed_at'], name='backend_rec_user_id_ff1f81_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recentview',
+            unique_together={('user', 'listing')},
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0015_view_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('operation_name', models.CharField(blank=True, default='', max_length=100)),
+                ('signature', models.CharField(max_length=500)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0.0)),
+                ('total_queries', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('hour', 'operation_name', 'signature')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FieldUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('field', models.CharField(max_length=200)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('hour', 'field')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0016_usage_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='password',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+    ]
@@ -1,12 +1,32 @@
+from django.contrib.auth.hashers import check_password, make_password
 from django.db import models
-from django.db.models.fields import BooleanField, CharField, DateField, DateTimeField, DecimalField, EmailField, PositiveIntegerField, URLField
-from django.db.models import ForeignKey
+from django.db.models.fields import BooleanField, CharField, DateField, DateTimeField, DecimalField, EmailField, FloatField, PositiveBigIntegerField, PositiveIntegerField, URLField
+from django.db.models import ForeignKey, JSONField, Q
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from django.db.models.fields.related import ManyToManyField
 from datetime import datetime
 
+
+class LiveManager(models.Manager):
+    # Default manager of the soft-deletable models: hides the rows that
+    # have a deleted_at. Use `all_objects` to see them too.
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class User(models.Model):
+    # Soft deletes: deleted users keep their row (with deleted_at set) until
+    # the purge_deleted command removes them. Emails only have to be unique
+    # among live users so a deleted account doesn't block signing up again.
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['email'], condition=Q(deleted_at__isnull=True), name='user_live_email_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='user_deleted_idx'),
+        ]
+
     # Validator functions
     def validate_edu_email(email: str):
         if email[-4:] != ".edu":
@@ -17,7 +37,7 @@ class User(models.Model):
             raise ValidationError(f"Classification has to be one of (Freshman, Sophomore, Junior, Senior, Graduate, PhD). Check spelling and capitalization.")
 
     # Fields
-    email = EmailField(unique=True, null=False, validators=[validate_email, validate_edu_email])
+    email = EmailField(null=False, db_index=True, validators=[validate_email, validate_edu_email])
     first_name = CharField(max_length=50, null=False)
     last_name = CharField(max_length=50, null=False)
     university = CharField(max_length=50, null=False)
@@ -25,20 +45,43 @@ class User(models.Model):
     thumbs_down = PositiveIntegerField(default=0)
     bio = CharField(max_length=5000, null=True, blank=True)
     classification = CharField(max_length=50, null=True, validators = [validate_classification])
+    deleted_at = DateTimeField(null=True, blank=True)
+    # incremented by every update, for optimistic locking (see concurrency.py)
+    version = PositiveIntegerField(default=0)
+    # hash (django.contrib.auth.hashers), users without one can't obtain a token
+    password = CharField(max_length=128, blank=True, default='')
+
+    # Managers
+    objects = LiveManager()
+    all_objects = models.Manager()
 
     # Helper functions
     def __str__(self) -> str:
         return f"{self.email}: {self.first_name} {self.last_name}"
 
+    def set_password(self, raw_password):
+        self.password = make_password(raw_password)
+
+    def check_password(self, raw_password) -> bool:
+        return bool(self.password) and check_password(raw_password, self.password)
+
 
 class Listing(models.Model):   
+    # Soft deletes, same as User. The partial indexes keep the feed
+    # queries on live rows fast and let the purge job find deleted ones.
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_created'], condition=Q(deleted_at__isnull=True), name='listing_live_created_idx'),
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='listing_deleted_idx'),
+        ]
+
     # Validator functions
     def validate_condition(condition: str):
         # TODO: Add the list of options for the condition of the item (new, like new, used, etc.)
         return 
 
     # Fields
-    item_name = CharField(max_length=50, null=False)
+    item_name = CharField(max_length=50, null=False, db_index=True)
     price = DecimalField(max_digits=6, decimal_places=2)
     negotiable = BooleanField(null=False)
     condition = CharField(max_length=50)
@@ -47,6 +90,13 @@ class Listing(models.Model):
     date_created = DateTimeField(default=datetime.now())
     sold = BooleanField(default=False)
     user = ForeignKey(User, on_delete=models.CASCADE)
+    deleted_at = DateTimeField(null=True, blank=True)
+    # incremented by every update, for optimistic locking (see concurrency.py)
+    version = PositiveIntegerField(default=0)
+
+    # Managers
+    objects = LiveManager()
+    all_objects = models.Manager()
 
     # Helpers
     def __str__(self) -> str:
@@ -63,7 +113,7 @@ class Category(models.Model):
         return
 
     # Fields
-    category_name = CharField(max_length=50)
+    category_name = CharField(max_length=50, db_index=True)
     listing = ForeignKey(Listing, on_delete=models.CASCADE)
 
     # Helpers
@@ -91,4 +141,291 @@ class Chat(models.Model):
 
     # Helpers
     def __str__(self) -> str:
-        return f"chat {self.chat_id} between {self.users}"
\ No newline at end of file
+        return f"chat {self.chat_id} between {self.users}"
+
+class DataVersion(models.Model):
+    # A counter bumped by every mutation. GET queries use it to build their
+    # ETags, so a client can revalidate a cached response with a single
+    # lookup instead of re-running the query.
+    name = CharField(max_length=50, unique=True)
+    version = PositiveBigIntegerField(default=0)
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"{self.name}: version {self.version}"
+
+
+class ListingNeighbor(models.Model):
+    # Precomputed "similar listings" table used by recommendedListings.
+    # Each unsold listing keeps its top-K most similar unsold listings.
+    # See recommendations.py for how the rows are computed.
+    class Meta:
+        unique_together = ('listing', 'neighbor')
+        indexes = [models.Index(fields=['listing', '-score'])]
+
+    # Fields
+    listing = ForeignKey(Listing, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = ForeignKey(Listing, on_delete=models.CASCADE, related_name='+')
+    score = FloatField()
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"{self.neighbor_id} similar to {self.listing_id} ({self.score:.2f})"
+
+
+class PriceSummary(models.Model):
+    # Running price statistics of the listings sharing a category, condition,
+    # university and sold flag, kept up to date by the listing mutations so
+    # that priceStats never scans the Listing table. Prices are counted in
+    # logarithmic buckets to answer median / percentile queries.
+    # See pricestats.py.
+    class Meta:
+        verbose_name_plural = "price summaries"
+        unique_together = ('category', 'condition', 'university', 'sold')
+
+    # Fields
+    # category is '*' for the row counting every listing once, whatever its categories
+    category = CharField(max_length=50)
+    condition = CharField(max_length=50)
+    university = CharField(max_length=50)
+    sold = BooleanField(default=False)
+    count = PositiveIntegerField(default=0)
+    total = DecimalField(max_digits=14, decimal_places=2, default=0)
+    buckets = JSONField(default=dict)
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"{self.count} {self.category} listings ({self.condition}) at {self.university}"
+
+
+# ========== ARCHIVE ===============
+# Sold listings are moved out of the live tables by the archive_listings
+# command (see archive.py) so that the unsold feed, its indexes and vacuum
+# don't pay for years of dead rows. Archived rows keep their original id.
+class ArchivedListing(models.Model):
+    # Fields
+    id = PositiveBigIntegerField(primary_key=True)
+    item_name = CharField(max_length=50, null=False)
+    price = DecimalField(max_digits=6, decimal_places=2)
+    negotiable = BooleanField(null=False)
+    condition = CharField(max_length=50)
+    description = CharField(max_length=5000, null=True)
+    location = CharField(max_length=50)
+    date_created = DateTimeField()
+    sold = BooleanField(default=True)
+    user = ForeignKey(User, on_delete=models.CASCADE)
+    archived_at = DateTimeField(auto_now_add=True)
+
+    # Helpers
+    def as_listing(self) -> Listing:
+        ''' An (unsaved) Listing with the archived values, for the GraphQL ListingType. '''
+        listing = Listing(
+            id=self.id,
+            item_name=self.item_name,
+            price=self.price,
+            negotiable=self.negotiable,
+            condition=self.condition,
+            description=self.description,
+            location=self.location,
+            date_created=self.date_created,
+            sold=self.sold,
+            user_id=self.user_id,
+        )
+        listing.archive = self
+        return listing
+
+    def __str__(self) -> str:
+        return f"{self.item_name} by user: {self.user_id} (archived)"
+
+
+class ArchivedCategory(models.Model):
+    class Meta:
+        verbose_name_plural = "archived categories"
+
+    # Fields
+    category_name = CharField(max_length=50)
+    listing = ForeignKey(ArchivedListing, on_delete=models.CASCADE, related_name='categories')
+
+    # Helpers
+    def as_category(self) -> Category:
+        return Category(id=self.id, category_name=self.category_name, listing_id=self.listing_id)
+
+    def __str__(self) -> str:
+        return f"{self.category_name} for archived Listing: {self.listing_id}"
+
+
+class ArchivedImage(models.Model):
+    # Fields
+    image_url = URLField()
+    listing = ForeignKey(ArchivedListing, on_delete=models.CASCADE, related_name='images')
+
+    # Helpers
+    def as_image(self) -> Image:
+        return Image(id=self.id, image_url=self.image_url, listing_id=self.listing_id)
+
+    def __str__(self) -> str:
+        return f"{self.image_url} for archived Listing: {self.listing_id}"
+
+
+class SavedSearch(models.Model):
+    # A filter set a user wants to be notified about. Empty fields match
+    # anything. New and edited listings are matched against the saved
+    # searches with indexed lookups, see savedsearches.py.
+    class Meta:
+        verbose_name_plural = "saved searches"
+        indexes = [
+            models.Index(fields=['category']),
+            models.Index(fields=['university']),
+            models.Index(fields=['max_price']),
+        ]
+
+    # Fields
+    user = ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = CharField(max_length=50, blank=True, default='')
+    category = CharField(max_length=50, null=True, blank=True)
+    # normalized (stripped, lowercase)
+    university = CharField(max_length=50, null=True, blank=True)
+    condition = CharField(max_length=50, null=True, blank=True)
+    min_price = DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    max_price = DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    created_at = DateTimeField(auto_now_add=True)
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"saved search {self.name or self.pk} of user {self.user_id}"
+
+
+class SearchMatch(models.Model):
+    # Notification queue: a listing that matched a saved search. Clients
+    # poll the undelivered matches of their user and mark them delivered.
+    class Meta:
+        verbose_name_plural = "search matches"
+        unique_together = ('saved_search', 'listing')
+        indexes = [
+            models.Index(fields=['user', 'created_at'], condition=Q(delivered_at__isnull=True), name='searchmatch_pending_idx'),
+        ]
+
+    # Fields
+    saved_search = ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    listing = ForeignKey(Listing, on_delete=models.CASCADE, related_name='+')
+    # denormalized from saved_search, for the queue index
+    user = ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = DateTimeField(auto_now_add=True)
+    delivered_at = DateTimeField(null=True, blank=True)
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"listing {self.listing_id} matches {self.saved_search_id}"
+
+
+class Task(models.Model):
+    # Background task queue, see tasks.py. Rows are written in the
+    # transaction of the mutation that enqueues them and run by the
+    # run_tasks worker command.
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'queued'), (RUNNING, 'running'), (DONE, 'done'), (FAILED, 'failed')]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at'], condition=Q(status='queued'), name='task_queued_idx'),
+            models.Index(fields=['status', 'finished_at'], name='task_status_idx'),
+        ]
+
+    # Fields
+    # dotted path of the task function
+    name = CharField(max_length=200)
+    args = JSONField(default=list)
+    status = CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = PositiveIntegerField(default=0)
+    max_attempts = PositiveIntegerField(default=3)
+    created_at = DateTimeField(auto_now_add=True)
+    # not run before (retries are delayed)
+    run_at = DateTimeField()
+    started_at = DateTimeField(null=True, blank=True)
+    # a running task past this time is considered abandoned by its worker
+    locked_until = DateTimeField(null=True, blank=True)
+    finished_at = DateTimeField(null=True, blank=True)
+    last_error = CharField(max_length=5000, blank=True, default='')
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"task {self.pk} {self.name} ({self.status})"
+
+
+class ListingStats(models.Model):
+    # View counters of a listing, written in batches by viewtracking.flush().
+    # trend is the log of the exponentially decayed view count, see
+    # viewtracking.py, so listings can be ranked on an index.
+    class Meta:
+        verbose_name_plural = "listing stats"
+        indexes = [
+            models.Index(fields=['university', '-trend']),
+            models.Index(fields=['-trend']),
+        ]
+
+    # Fields
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    views = PositiveBigIntegerField(default=0)
+    trend = FloatField()
+    # seller's university (normalized), denormalized for trendingListings
+    university = CharField(max_length=50, blank=True, default='')
+    last_viewed_at = DateTimeField(null=True, blank=True)
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"{self.views} views of listing {self.listing_id}"
+
+
+class RecentView(models.Model):
+    # The last listings a user looked at (at most viewtracking RECENT_LIMIT per user)
+    class Meta:
+        unique_together = ('user', 'listing')
+        indexes = [models.Index(fields=['user', '-viewed_at'])]
+
+    # Fields
+    user = ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    listing = ForeignKey(Listing, on_delete=models.CASCADE, related_name='+')
+    viewed_at = DateTimeField()
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"user {self.user_id} viewed listing {self.listing_id}"
+
+
+class OperationUsage(models.Model):
+    # Sampled GraphQL operations, aggregated per hour, operation name and
+    # signature (the root fields with the names of their arguments, e.g.
+    # "listings(categories,maxPrice)"). See usage.py.
+    class Meta:
+        unique_together = ('hour', 'operation_name', 'signature')
+
+    # Fields
+    hour = DateTimeField(db_index=True)
+    operation_name = CharField(max_length=100, blank=True, default='')
+    signature = CharField(max_length=500)
+    count = PositiveBigIntegerField(default=0)
+    # sums over the sampled requests, divide by count for the averages
+    total_seconds = FloatField(default=0.0)
+    total_queries = PositiveBigIntegerField(default=0)
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"{self.signature} x{self.count} at {self.hour}"
+
+
+class FieldUsage(models.Model):
+    # Number of sampled requests selecting a field ("ListingType.description"), per hour
+    class Meta:
+        unique_together = ('hour', 'field')
+
+    # Fields
+    hour = DateTimeField(db_index=True)
+    field = CharField(max_length=200)
+    count = PositiveBigIntegerField(default=0)
+
+    # Helpers
+    def __str__(self) -> str:
+        return f"{self.field} x{self.count} at {self.hour}"
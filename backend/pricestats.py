@@ -0,0 +1,196 @@
+'''
+Price statistics per category / condition / university, for the "suggested
+price" widget and the analytics dashboards.
+
+Every listing is counted in the PriceSummary row of each of its categories,
+plus once in the '*' row (so stats over all categories don't count a listing
+twice). A row keeps the count, the sum of prices and a histogram of prices in
+logarithmic buckets: bucket i holds the prices in (GAMMA^(i-1), GAMMA^i], so
+any percentile read from the histogram is within ~2.5% of the exact value.
+
+The mutations call add() / update() with a snapshot() of the listing taken
+before and after they change it, deleted listings are remove()d when the
+purge job deletes them (see purge.py); rebuild() recomputes everything. So
+the statistics cover every Listing row (soft-deleted ones until they are
+purged) and every ArchivedListing row: archiving doesn't change them.
+'''
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import ArchivedListing, Listing, PriceSummary
+
+ALL_CATEGORIES = '*'
+GAMMA = 1.05
+# prices of 0 don't have a logarithm, they get their own bucket
+ZERO_BUCKET = 'zero'
+
+
+def bucket_of(price) -> str:
+    price = float(price)
+    if price <= 0:
+        return ZERO_BUCKET
+    return str(math.ceil(math.log(price, GAMMA)))
+
+
+def bucket_value(bucket) -> float:
+    ''' Representative price of a bucket (the point with the lowest relative error). '''
+    if bucket == ZERO_BUCKET:
+        return 0.0
+    index = int(bucket)
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def snapshot(listing):
+    '''
+    What the statistics need to know about a listing. Taken before and
+    after a mutation to tell whether (and how) the stats must change.
+    Works for archived listings too.
+    '''
+    categories = listing.categories if isinstance(listing, ArchivedListing) else listing.category_set
+    return {
+        'price': Decimal(listing.price),
+        'condition': listing.condition or '',
+        'university': (listing.user.university or '').strip().lower(),
+        'sold': bool(listing.sold),
+        # uses the prefetched categories when there are any
+        'categories': tuple(sorted({category.category_name for category in categories.all()})),
+    }
+
+
+def _keys(snap):
+    for category in snap['categories'] + (ALL_CATEGORIES,):
+        yield {
+            'category': category,
+            'condition': snap['condition'],
+            'university': snap['university'],
+            'sold': snap['sold'],
+        }
+
+
+def _apply(signed_snaps):
+    # group the (sign, snapshot) changes per summary row first, so each row is
+    # written once and rows both changes touch are written once too
+    changes = {}
+    for sign, snap in signed_snaps:
+        bucket = bucket_of(snap['price'])
+        for key in _keys(snap):
+            change = changes.setdefault(tuple(key.items()), {'count': 0, 'total': Decimal(0), 'buckets': defaultdict(int)})
+            change['count'] += sign
+            change['total'] += sign * snap['price']
+            change['buckets'][bucket] += sign
+
+    with transaction.atomic():
+        # lock the rows in a fixed order, so concurrent updates can't deadlock
+        for key, change in sorted(changes.items()):
+            if not change['count'] and not change['total'] and not any(change['buckets'].values()):
+                continue
+            summary, created = PriceSummary.objects.select_for_update().get_or_create(**dict(key))
+            summary.count = max(summary.count + change['count'], 0)
+            summary.total += change['total']
+            for bucket, count in change['buckets'].items():
+                summary.buckets[bucket] = summary.buckets.get(bucket, 0) + count
+                if summary.buckets[bucket] <= 0:
+                    del summary.buckets[bucket]
+            summary.save()
+
+
+def add(*snaps):
+    _apply((1, snap) for snap in snaps)
+
+
+def remove(*snaps):
+    _apply((-1, snap) for snap in snaps)
+
+
+def update(old, new):
+    ''' Move a listing from its old stats to its new ones, if anything changed. '''
+    if old != new:
+        _apply([(-1, old), (1, new)])
+
+
+def counted_listings(chunk_size=2000):
+    ''' Every listing the statistics cover (see above), chunk_size at a time. '''
+    sources = (
+        Listing.all_objects.select_related('user').prefetch_related('category_set'),
+        ArchivedListing.objects.select_related('user').prefetch_related('categories'),
+    )
+    for listings in sources:
+        listings = listings.order_by('pk')
+        last_pk = 0
+        while True:
+            chunk = list(listings.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            yield from chunk
+
+
+def rebuild(chunk_size=2000):
+    ''' Recompute every summary from the listing tables. Returns the number of rows. '''
+    summaries = {}
+    for listing in counted_listings(chunk_size):
+        snap = snapshot(listing)
+        bucket = bucket_of(snap['price'])
+        for key in _keys(snap):
+            summary_key = tuple(key.values())
+            summary = summaries.get(summary_key)
+            if summary is None:
+                summary = summaries[summary_key] = PriceSummary(buckets={}, **key)
+            summary.count += 1
+            summary.total += snap['price']
+            summary.buckets[bucket] = summary.buckets.get(bucket, 0) + 1
+
+    with transaction.atomic():
+        PriceSummary.objects.all().delete()
+        PriceSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+    return len(summaries)
+
+
+def percentile(buckets, count, fraction):
+    ''' Approximate (nearest rank) percentile, 0 <= fraction <= 1, from merged buckets. '''
+    if count == 0:
+        return None
+    rank = max(math.ceil(fraction * count), 1)
+    seen = 0
+    ordered = sorted(buckets.items(), key=lambda item: -math.inf if item[0] == ZERO_BUCKET else int(item[0]))
+    for bucket, bucket_count in ordered:
+        seen += bucket_count
+        if seen >= rank:
+            return bucket_value(bucket)
+    return bucket_value(ordered[-1][0])
+
+
+def price_stats(category=None, condition=None, university=None, sold=None):
+    '''
+    Merge the summaries matching the filters (None means any) and return the
+    count, mean and percentile bands.
+    '''
+    summaries = PriceSummary.objects.filter(category=category or ALL_CATEGORIES)
+    if condition is not None:
+        summaries = summaries.filter(condition=condition)
+    if university is not None:
+        summaries = summaries.filter(university=university.strip().lower())
+    if sold is not None:
+        summaries = summaries.filter(sold=sold)
+
+    count = 0
+    total = Decimal(0)
+    buckets = defaultdict(int)
+    for summary in summaries:
+        count += summary.count
+        total += summary.total
+        for bucket, bucket_count in summary.buckets.items():
+            buckets[bucket] += bucket_count
+
+    return {
+        'count': count,
+        'mean': float(total / count) if count else None,
+        'p10': percentile(buckets, count, 0.10),
+        'p25': percentile(buckets, count, 0.25),
+        'median': percentile(buckets, count, 0.50),
+        'p75': percentile(buckets, count, 0.75),
+        'p90': percentile(buckets, count, 0.90),
+    }
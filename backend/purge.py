@@ -0,0 +1,80 @@
+'''
+Hard deletion of soft-deleted users and listings.
+
+The delete mutations only set deleted_at (see DeleteUser / DeleteListing),
+purge() removes the rows later, in batches, so that Django's cascade over a
+big seller's listings never runs inside a request and never holds locks for
+long. It also takes the (live and archived) listings out of the price statistics.
+'''
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import pricestats
+from .models import ArchivedListing, Listing, User
+
+
+def _purge_listings(cutoff, batch_size):
+    ids = list(
+        Listing.all_objects.filter(deleted_at__lte=cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    with transaction.atomic():
+        listings = Listing.all_objects.filter(pk__in=ids).select_related('user').prefetch_related('category_set')
+        pricestats.remove(*[pricestats.snapshot(listing) for listing in listings])
+        # cascades to the categories and recommendation rows, images are kept (listing set to NULL)
+        Listing.all_objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def _purge_archived(cutoff, batch_size):
+    ids = list(
+        ArchivedListing.objects.filter(user__deleted_at__lte=cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    with transaction.atomic():
+        archived = ArchivedListing.objects.filter(pk__in=ids).select_related('user').prefetch_related('categories')
+        pricestats.remove(*[pricestats.snapshot(listing) for listing in archived])
+        ArchivedListing.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def _purge_users(cutoff, batch_size):
+    # Deleting a user deletes their listings too (same deleted_at), so by
+    # now the users have nothing big left to cascade to.
+    ids = list(
+        User.all_objects.filter(deleted_at__lte=cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    with transaction.atomic():
+        User.all_objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def purge(grace_seconds=0, batch_size=200, max_batches=None, pause=0.0, log=None):
+    '''
+    Hard delete the listings, then the archived listings of deleted users,
+    then the users deleted more than grace_seconds ago, batch_size rows per
+    transaction. Returns (listings, users) purged.
+    '''
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+    purged = {'listings': 0, 'archived listings': 0, 'users': 0}
+    batches = 0
+    phases = (('listings', _purge_listings), ('archived listings', _purge_archived), ('users', _purge_users))
+    for kind, purge_batch in phases:
+        while max_batches is None or batches < max_batches:
+            count = purge_batch(cutoff, batch_size)
+            if not count:
+                break
+            purged[kind] += count
+            batches += 1
+            if log:
+                log(f"batch {batches}: purged {count} {kind}")
+            if pause:
+                time.sleep(pause)
+    return purged['listings'], purged['users']
@@ -0,0 +1,190 @@
+'''
+Token bucket rate limiting for the GraphQL endpoint.
+
+Every client (IP address) has a bucket of BURST tokens
+that refills at RATE tokens per second. A request costs tokens depending on
+what it does (see operation_cost) and is rejected with a 429 when the bucket
+doesn't hold enough of them.
+
+Configured with the GRAPHQL_RATE_LIMIT setting:
+
+    GRAPHQL_RATE_LIMIT = {
+        'ENABLED': True,
+        'BACKEND': 'memory',    # 'memory' (per process: N workers allow N * RATE)
+                                # or 'cache' (shared through the CACHE cache)
+        'CACHE': 'default',     # cache alias used by the 'cache' backend
+        'RATE': 20,             # tokens refilled per second
+        'BURST': 200,           # size of the bucket
+        'NUM_PROXIES': 0,       # reverse proxies in front of the app (1 on Heroku)
+        'COSTS': {'query': 1, 'mutation': 10, 'fields': {'listings': 5}},
+    }
+'''
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import parse
+from graphql.error import GraphQLError
+from graphql.language import ast
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'memory',
+    'CACHE': 'default',
+    'RATE': 20,
+    'BURST': 200,
+    'NUM_PROXIES': 0,
+    'COSTS': {
+        'query': 1,
+        'mutation': 10,
+        # top level fields returning (potentially) large lists
+        'fields': {'listings': 5, 'users': 5, 'images': 5, 'categories': 5},
+    },
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'GRAPHQL_RATE_LIMIT', {}))
+    return config
+
+
+def refill(tokens, updated, now, rate, burst):
+    ''' Tokens in a bucket that held `tokens` at time `updated`. '''
+    return min(burst, tokens + (now - updated) * rate)
+
+
+def take(tokens, cost, rate):
+    '''
+    Try to take `cost` tokens out of a bucket holding `tokens`.
+    Returns (allowed, tokens left, seconds until the request would be allowed).
+    '''
+    if tokens >= cost:
+        return True, tokens - cost, 0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryBackend:
+    ''' Buckets kept in this process. Only the `max_keys` most recent clients are kept. '''
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = refill(tokens, updated, now, rate, burst)
+            allowed, tokens, retry_after = take(tokens, cost, rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBackend:
+    '''
+    Buckets kept in a Django cache, shared by every process when the cache is
+    (the DatabaseCache of settings.CACHES is, a LocMemCache isn't). The read and the
+    write are not atomic, so concurrent requests of one client can slip a
+    few tokens through; good enough for throttling.
+    '''
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def consume(self, key, cost, rate, burst):
+        cache = caches[self.alias]
+        cache_key = f'ratelimit:{key}'
+        now = time.time()
+        tokens, updated = cache.get(cache_key, (burst, now))
+        tokens = refill(tokens, updated, now, rate, burst)
+        allowed, tokens, retry_after = take(tokens, cost, rate)
+        # a bucket untouched for burst / rate seconds is full again anyway
+        cache.set(cache_key, (tokens, now), timeout=math.ceil(burst / rate) + 1)
+        return allowed, tokens, retry_after
+
+    def clear(self):
+        pass
+
+
+memory_backend = MemoryBackend()
+
+
+def get_backend(config):
+    if config['BACKEND'] == 'cache':
+        return CacheBackend(config['CACHE'])
+    return memory_backend
+
+
+def client_key(request, config):
+    '''
+    Rate limit clients by IP address, authenticated or not: accounts (and so
+    tokens) can be created freely, a client rotating between users would
+    get a fresh bucket for each of them.
+    '''
+    ip = request.META.get('REMOTE_ADDR', '')
+    num_proxies = config['NUM_PROXIES']
+    if num_proxies:
+        # each proxy appends the address it got the request from, so the
+        # client is the one added by the outermost proxy we trust
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= num_proxies:
+            ip = forwarded[-num_proxies]
+    return f'ip:{ip}'
+
+
+def root_fields(selection_set, fragments, spread=()):
+    ''' The top level fields of a selection set, with the fragments (spreads and inline) expanded. '''
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            yield selection
+        elif isinstance(selection, ast.InlineFragment):
+            yield from root_fields(selection.selection_set, fragments, spread)
+        elif isinstance(selection, ast.FragmentSpread):
+            name = selection.name.value
+            # unknown and cyclic spreads are rejected by graphene anyway
+            if name in fragments and name not in spread:
+                yield from root_fields(fragments[name].selection_set, fragments, spread + (name,))
+
+
+def operation_cost(query, costs, operation_name=None):
+    '''
+    Cost of a GraphQL document: mutations cost costs['mutation'] per top level
+    field, queries cost the sum of their top level fields (costs['fields'][name],
+    or costs['query'] for fields not listed). Fragments are expanded and aliased
+    fields counted each time. Only the operation `operation_name` is counted
+    when given, every operation otherwise.
+    '''
+    field_costs = costs.get('fields', {})
+    try:
+        document = parse(query)
+    except (GraphQLError, TypeError):
+        # invalid documents are rejected by graphene, charge a plain query
+        return costs['query']
+
+    operations = [definition for definition in document.definitions if isinstance(definition, ast.OperationDefinition)]
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions if isinstance(definition, ast.FragmentDefinition)
+    }
+    if operation_name:
+        operations = [operation for operation in operations if operation.name and operation.name.value == operation_name]
+
+    cost = 0
+    for operation in operations:
+        for field in root_fields(operation.selection_set, fragments):
+            if operation.operation == 'mutation':
+                cost += costs['mutation']
+            else:
+                cost += field_costs.get(field.name.value, costs['query'])
+    return max(cost, costs['query'])
@@ -0,0 +1,299 @@
+'''
+Item-item recommendations for the home feed.
+
+Two unsold listings are similar when they share categories, are sold at the
+same university and are in the same price range:
+
+    score = 0.60 * jaccard(categories) + 0.25 * same university + 0.15 * price closeness
+
+Listings that share neither a category nor a university are never neighbors.
+The top-K neighbors of every unsold listing are stored in ListingNeighbor:
+1. rebuild() recomputes the whole table in NumPy batches (compute_recommendations command)
+2. refresh_listing() / remove_listing() keep it up to date when a listing is
+   created, edited or sold (through the refresh_listings task), recomputing
+   the neighbor lists a listing drops out of
+so recommend() only has to read precomputed rows.
+'''
+import math
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+
+from .caching import bump_data_version
+from .models import Category, Listing, ListingNeighbor, User
+from .tasks import task
+
+TOP_K = 20
+CATEGORY_WEIGHT = 0.60
+UNIVERSITY_WEIGHT = 0.25
+PRICE_WEIGHT = 0.15
+
+
+def price_band(price) -> int:
+    ''' Power of two price bands: $0-1, $2-3, $4-7, $8-15, ... '''
+    return int(math.log2(max(float(price), 1.0)))
+
+
+class Features:
+    '''
+    Feature arrays of a set of listings, one row per listing: ids, university
+    codes, price bands and the categories as an inverted index (category
+    code -> positions of the listings in it) with the number of categories
+    per listing. Memory grows with the number of (listing, category) pairs,
+    not with listings * categories.
+    '''
+
+    def __init__(self, listings, vocabulary=None, universities=None):
+        # vocabularies are shared when comparing two feature sets
+        self.vocabulary = vocabulary if vocabulary is not None else {}
+        self.universities = universities if universities is not None else {}
+
+        rows = list(listings.values_list('id', 'price', 'user__university'))
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.bands = np.array([price_band(row[1]) for row in rows], dtype=np.int32)
+        self.university = np.array(
+            [self.universities.setdefault((row[2] or '').strip().lower(), len(self.universities)) for row in rows],
+            dtype=np.int32,
+        )
+
+        position = {listing_id: i for i, listing_id in enumerate(self.ids.tolist())}
+        postings = {}
+        for listing_id, name in Category.objects.filter(listing__in=listings.values('pk')).values_list('listing_id', 'category_name'):
+            # skip listings created after the first query
+            if listing_id in position:
+                postings.setdefault(self.vocabulary.setdefault(name, len(self.vocabulary)), set()).add(position[listing_id])
+        self.postings = {column: np.array(sorted(positions), dtype=np.int64) for column, positions in postings.items()}
+        self.category_count = np.zeros(len(rows), dtype=np.float32)
+        for positions in self.postings.values():
+            self.category_count[positions] += 1.0
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def similarity(a, b, rows=slice(None)):
+    ''' Scores between the listings a[rows] and every listing of b, as a matrix. '''
+    selected = np.zeros(len(a), dtype=bool)
+    selected[rows] = True
+    # position in a -> row of the result
+    row_of = np.cumsum(selected) - 1
+    shared = np.zeros((int(selected.sum()), len(b)), dtype=np.float32)
+    # add 1 for every category the two listings have in common
+    for column, a_positions in a.postings.items():
+        b_positions = b.postings.get(column)
+        a_positions = a_positions[selected[a_positions]]
+        if b_positions is not None and len(a_positions):
+            shared[np.ix_(row_of[a_positions], b_positions)] += 1.0
+    union = a.category_count[rows][:, None] + b.category_count[None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+    same_university = a.university[rows][:, None] == b.university[None, :]
+    price = np.clip(1.0 - np.abs(a.bands[rows][:, None] - b.bands[None, :]) / 2.0, 0.0, 1.0)
+
+    scores = CATEGORY_WEIGHT * jaccard + UNIVERSITY_WEIGHT * same_university + PRICE_WEIGHT * price
+    scores[(shared == 0) & ~same_university] = 0.0
+    return scores
+
+
+def top_k(scores, ids, k):
+    ''' For every row, the (ids, scores) of the k best positive scores. '''
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return [([], []) for _ in range(scores.shape[0])]
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    result = []
+    for row, columns in enumerate(best):
+        columns = columns[scores[row, columns] > 0]
+        columns = columns[np.argsort(-scores[row, columns])]
+        result.append((ids[columns].tolist(), scores[row, columns].tolist()))
+    return result
+
+
+def neighbor_rows(targets, candidates, k, chunk_size=256):
+    ''' ListingNeighbor rows of the top-k candidates of every target, chunk_size targets at a time. '''
+    rows = []
+    for start in range(0, len(targets), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        scores = similarity(targets, candidates, chunk)
+        # a listing is not its own neighbor
+        scores[targets.ids[chunk][:, None] == candidates.ids[None, :]] = 0.0
+        for listing_id, (neighbors, values) in zip(targets.ids[chunk].tolist(), top_k(scores, candidates.ids, k)):
+            rows.extend(
+                ListingNeighbor(listing_id=listing_id, neighbor_id=neighbor_id, score=score)
+                for neighbor_id, score in zip(neighbors, values)
+            )
+    return rows
+
+
+def live_listings():
+    return Listing.objects.filter(sold=False)
+
+
+def related_listings(listings):
+    ''' Live listings sharing a category or the university with one of `listings` (the only possible neighbors). '''
+    categories = Category.objects.filter(listing__in=listings).values('category_name')
+    universities = set(listings.values_list('user__university', flat=True))
+    same_university = Q(pk__in=[])
+    for university in universities:
+        same_university |= Q(user__university__iexact=university)
+    return live_listings().filter(
+        Q(pk__in=Category.objects.filter(category_name__in=categories).values('listing')) | same_university
+    )
+
+
+def rebuild(k=TOP_K, chunk_size=256):
+    ''' Recompute the whole neighbor table. Returns the number of rows written. '''
+    features = Features(live_listings())
+    rows = neighbor_rows(features, features, k, chunk_size)
+
+    with transaction.atomic():
+        ListingNeighbor.objects.all().delete()
+        ListingNeighbor.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def recompute(listing_ids, k=TOP_K):
+    '''
+    Recompute the neighbor lists of the given listings (dropping those of
+    listings no longer live). Returns the number of rows deleted and written.
+    '''
+    listing_ids = list(listing_ids)
+    if not listing_ids:
+        return 0
+    listings = live_listings().filter(pk__in=listing_ids)
+    targets = Features(listings)
+    candidates = Features(related_listings(listings), vocabulary=targets.vocabulary, universities=targets.universities)
+    rows = neighbor_rows(targets, candidates, k) if len(targets) and len(candidates) else []
+    with transaction.atomic():
+        deleted, _ = ListingNeighbor.objects.filter(listing__in=listing_ids).delete()
+        ListingNeighbor.objects.bulk_create(rows, batch_size=1000)
+    return deleted + len(rows)
+
+
+def forget_listing(listing_id):
+    '''
+    Delete the rows of a listing. Returns the ids of the listings it was a
+    neighbor of and the number of rows deleted.
+    '''
+    affected = set(ListingNeighbor.objects.filter(neighbor_id=listing_id).values_list('listing_id', flat=True))
+    deleted, _ = ListingNeighbor.objects.filter(Q(listing_id=listing_id) | Q(neighbor_id=listing_id)).delete()
+    return affected, deleted
+
+
+def remove_listing(listing_id, k=TOP_K):
+    '''
+    Forget a listing that was sold or deleted, and refill the neighbor lists
+    it leaves. Returns the number of rows changed.
+    '''
+    affected, deleted = forget_listing(listing_id)
+    return deleted + recompute(affected, k)
+
+
+def refresh_listing(listing, k=TOP_K):
+    '''
+    Recompute the neighbors of a new or edited listing, and add it to the
+    neighbor lists of the listings it now beats. Only listings sharing a
+    category or the university are compared, as no other can be a neighbor.
+    The lists it drops out of are recomputed. Returns the number of rows changed.
+    '''
+    affected, deleted = forget_listing(listing.id)
+    if listing.sold:
+        return deleted + recompute(affected, k)
+
+    listings = Listing.objects.filter(pk=listing.pk)
+    target = Features(listings)
+    candidates = Features(
+        related_listings(listings).exclude(pk=listing.pk),
+        vocabulary=target.vocabulary,
+        universities=target.universities,
+    )
+    if not len(target) or not len(candidates):
+        return deleted + recompute(affected, k)
+
+    scores = similarity(target, candidates)
+    neighbors, values = top_k(scores, candidates.ids, k)[0]
+    rows = [
+        ListingNeighbor(listing_id=listing.id, neighbor_id=neighbor_id, score=score)
+        for neighbor_id, score in zip(neighbors, values)
+    ]
+
+    # Reverse direction: the listing joins a candidate's list when that list
+    # is not full yet or when it beats the list's weakest neighbor. Only the
+    # candidates it scores highest with are considered to bound the work.
+    reverse_candidates, reverse_scores = top_k(scores, candidates.ids, 4 * k)[0]
+    current = {
+        row['listing']: row
+        for row in ListingNeighbor.objects.filter(listing__in=reverse_candidates)
+            .values('listing').annotate(count=Count('id'), lowest=Min('score'))
+    }
+    full = []
+    for candidate_id, score in zip(reverse_candidates, reverse_scores):
+        stats = current.get(candidate_id)
+        if stats is None or stats['count'] < k:
+            rows.append(ListingNeighbor(listing_id=candidate_id, neighbor_id=listing.id, score=score))
+        elif score > stats['lowest']:
+            rows.append(ListingNeighbor(listing_id=candidate_id, neighbor_id=listing.id, score=score))
+            full.append(candidate_id)
+
+    with transaction.atomic():
+        if full:
+            # drop the weakest neighbor of the lists that were already full
+            weakest = {}
+            for pk, candidate_id, score in ListingNeighbor.objects.filter(listing__in=full).values_list('pk', 'listing_id', 'score'):
+                if candidate_id not in weakest or score < weakest[candidate_id][1]:
+                    weakest[candidate_id] = (pk, score)
+            deleted += ListingNeighbor.objects.filter(pk__in=[pk for pk, score in weakest.values()]).delete()[0]
+        ListingNeighbor.objects.bulk_create(rows)
+
+    # lists the listing was in before the edit and didn't get back into
+    return deleted + len(rows) + recompute(affected - {row.listing_id for row in rows if row.neighbor_id == listing.id}, k)
+
+
+@task(batch=True)
+def refresh_listings(calls):
+    '''
+    Task queued by the listing mutations with the id of the listing. A batch
+    refreshes each listing once, however many times it was queued.
+    '''
+    changed = 0
+    for listing_id in dict.fromkeys(args[0] for args in calls):
+        listing = Listing.objects.select_related('user').filter(pk=listing_id).first()
+        if listing is None:
+            changed += remove_listing(listing_id)
+        else:
+            changed += refresh_listing(listing)
+    # the recommendedListings responses the mutation's version bump allowed
+    # to cache are stale now
+    if changed:
+        bump_data_version()
+
+
+def recommend(user_id, first=20):
+    '''
+    Listings recommended to a user: the neighbors of the user's own listings
+    (most similar first), topped up with the newest listings of the user's
+    university. A missing `first` means 20, a negative one nothing.
+    '''
+    first = max(first if first is not None else 20, 0)
+    seeds = list(
+        Listing.objects.filter(user_id=user_id).order_by('-date_created').values_list('id', flat=True)[:50]
+    )
+    ranked = list(
+        ListingNeighbor.objects.filter(listing__in=seeds, neighbor__sold=False, neighbor__deleted_at__isnull=True)
+            .exclude(neighbor__user_id=user_id)
+            .values('neighbor')
+            .annotate(total=Sum('score'))
+            .order_by('-total')
+            .values_list('neighbor', flat=True)[:first]
+    )
+    listings = Listing.objects.in_bulk(ranked)
+    result = [listings[listing_id] for listing_id in ranked if listing_id in listings]
+
+    if len(result) < first:
+        newest = live_listings().exclude(user_id=user_id).exclude(pk__in=ranked).order_by('-date_created')
+        university = User.objects.filter(pk=user_id).values_list('university', flat=True).first()
+        if university:
+            newest = newest.filter(user__university__iexact=university)
+        result.extend(newest[:first - len(result)])
+    return result
@@ -0,0 +1,85 @@
+'''
+Saved searches.
+
+Instead of re-running every saved search, each new or edited listing is
+matched once, by the match_listing task the mutation queues (see tasks.py),
+against the saved searches whose predicates it satisfies:
+
+    category IS NULL OR category IN (<listing categories>)
+    university IS NULL OR university = <seller's university>
+    condition IS NULL OR condition = <listing condition>
+    min_price IS NULL OR min_price <= <price>
+    max_price IS NULL OR max_price >= <price>
+
+The category, university and max_price indexes act as the inverted index.
+Every match becomes a SearchMatch row, the per-user notification queue read
+by the searchMatches query.
+'''
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import bump_data_version
+from .models import Category, Listing, SavedSearch, SearchMatch
+from .tasks import task
+
+
+def normalize_university(university):
+    return (university or '').strip().lower() or None
+
+
+def matching_searches(listing):
+    ''' Saved searches (of other, live users) the listing matches. '''
+    categories = list(Category.objects.filter(listing=listing).values_list('category_name', flat=True))
+    university = normalize_university(listing.user.university)
+    return SavedSearch.objects.filter(
+        Q(category__isnull=True) | Q(category__in=categories),
+        Q(university__isnull=True) | Q(university=university),
+        Q(condition__isnull=True) | Q(condition=listing.condition),
+        Q(min_price__isnull=True) | Q(min_price__lte=listing.price),
+        Q(max_price__isnull=True) | Q(max_price__gte=listing.price),
+        user__deleted_at__isnull=True,
+    ).exclude(user_id=listing.user_id)
+
+
+@task()
+def match_listing(listing_id):
+    '''
+    Queue a SearchMatch for every saved search the listing matches. Searches
+    it already matched are not notified again. Returns the number of new matches.
+    '''
+    listing = Listing.objects.select_related('user').filter(pk=listing_id, sold=False).first()
+    if listing is None:
+        return 0
+    searches = matching_searches(listing).values_list('pk', 'user_id')
+    matches = [
+        SearchMatch(saved_search_id=search_id, user_id=user_id, listing_id=listing.pk)
+        for search_id, user_id in searches
+    ]
+    existing = set(
+        SearchMatch.objects.filter(listing=listing, saved_search__in=[match.saved_search_id for match in matches])
+            .values_list('saved_search_id', flat=True)
+    )
+    matches = [match for match in matches if match.saved_search_id not in existing]
+    SearchMatch.objects.bulk_create(matches, ignore_conflicts=True)
+    if matches:
+        # searchMatches responses cached since the mutation are stale now
+        bump_data_version()
+    return len(matches)
+
+
+def pending_matches(user_id):
+    ''' The undelivered matches of a user, oldest first, skipping listings sold or deleted since. '''
+    return (
+        SearchMatch.objects.filter(user_id=user_id, delivered_at__isnull=True,
+                                   listing__sold=False, listing__deleted_at__isnull=True)
+            .select_related('listing', 'saved_search')
+            .order_by('created_at')
+    )
+
+
+def mark_delivered(user_id, ids=None):
+    ''' Mark the given (by default all) pending matches of a user as delivered. Returns how many. '''
+    matches = SearchMatch.objects.filter(user_id=user_id, delivered_at__isnull=True)
+    if ids is not None:
+        matches = matches.filter(pk__in=ids)
+    return matches.update(delivered_at=timezone.now())
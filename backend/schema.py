@@ -4,18 +4,43 @@ from graphene.types.scalars import String
 from graphene.types.structures import List
 from graphene_django import DjangoObjectType
 from datetime import datetime, timedelta
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
 
-from .models import Category, Image, Listing, User, Chat
+from .models import ArchivedListing, Category, Image, Listing, User, Chat, SavedSearch, SearchMatch
+from .caching import bump_data_version
+from .concurrency import save_changes
+from . import archive, auth, pricestats, recommendations, savedsearches, viewtracking
 
 # ========== MODELS ===============
 class UserType(DjangoObjectType):
     class Meta:
         model = User
+        exclude = ('password',)
+
+    # Last listings the user fetched with listing(id), see viewtracking.py
+    recently_viewed = graphene.List(lambda: ListingType, first=graphene.Int(required=False, default_value=None))
+
+    def resolve_recently_viewed(self, info, **kwargs):
+        return viewtracking.recently_viewed(self.pk, kwargs.get('first'))
 
 class ListingType(DjangoObjectType):
     class Meta:
         model = Listing
 
+    # Archived listings (see archive.py) keep their images and
+    # categories in the archive tables
+    def resolve_image_set(self, info, **kwargs):
+        if getattr(self, 'archive', None) is not None:
+            return [image.as_image() for image in self.archive.images.all()]
+        return self.image_set.all()
+
+    def resolve_category_set(self, info, **kwargs):
+        if getattr(self, 'archive', None) is not None:
+            return [category.as_category() for category in self.archive.categories.all()]
+        return self.category_set.all()
+
 class ImageType(DjangoObjectType):
     class Meta:
         model = Image
@@ -28,6 +53,25 @@ class ChatType(DjangoObjectType):
     class Meta:
         model = Chat
 
+class SavedSearchType(DjangoObjectType):
+    class Meta:
+        model = SavedSearch
+        exclude = ('matches',)
+
+class SearchMatchType(DjangoObjectType):
+    class Meta:
+        model = SearchMatch
+
+class PriceStatsType(graphene.ObjectType):
+    # Approximate (within ~2.5%) percentiles, see pricestats.py
+    count = graphene.Int()
+    mean = graphene.Float()
+    p10 = graphene.Float()
+    p25 = graphene.Float()
+    median = graphene.Float()
+    p75 = graphene.Float()
+    p90 = graphene.Float()
+
 
 ## ========== QUERIES =================
 # We specify the GraphQL Type for Graphene. But graphene_django
@@ -53,15 +97,44 @@ class Query(graphene.ObjectType):
         sold=graphene.Boolean(required=False,default_value=None),
         userID=graphene.Int(required=False,default_value=None),
         university=graphene.String(required=False,default_value=None),
-        userEmail=graphene.String(required=False, default_value=None)
+        userEmail=graphene.String(required=False, default_value=None),
+        first=graphene.Int(required=False, default_value=None),
+        offset=graphene.Int(required=False, default_value=0)
     )
 
 
+    # Personalized home feed, see recommendations.py
+    recommended_listings = graphene.List(ListingType,
+        userID=graphene.Int(required=True),
+        first=graphene.Int(required=False, default_value=20)
+    )
+
+    # Most viewed listings lately (views decay with a 24h half-life), see viewtracking.py
+    trending_listings = graphene.List(ListingType,
+        university=graphene.String(required=False, default_value=None),
+        first=graphene.Int(required=False, default_value=20)
+    )
+
+    # Price statistics of the listings matching the filters, for price suggestions
+    price_stats = graphene.Field(PriceStatsType,
+        category=graphene.String(required=False, default_value=None),
+        condition=graphene.String(required=False, default_value=None),
+        university=graphene.String(required=False, default_value=None),
+        sold=graphene.Boolean(required=False, default_value=None)
+    )
+
     categories = graphene.List(CategoryType)
     images = graphene.List(ImageType)
     chats = graphene.List(ChatType, email=graphene.String(required=False, default_value=None), userID = graphene.ID(required=False, default_value=None))
 
     user = graphene.Field(UserType, id=graphene.Int(required=False, default_value=None), email=graphene.String(required=False, default_value=None))
+    # The user of the request's bearer token (see auth.py), null if there is none
+    me = graphene.Field(UserType)
+
+    # Saved searches of a user and the listings that matched them since the
+    # last markSearchMatchesDelivered, see savedsearches.py
+    saved_searches = graphene.List(SavedSearchType, userID=graphene.Int(required=True))
+    search_matches = graphene.List(SearchMatchType, userID=graphene.Int(required=True))
     listing = graphene.Field(ListingType, id=graphene.Int())
     category = graphene.Field(CategoryType, id=graphene.Int())
     image = graphene.Field(ImageType, id=graphene.Int())
@@ -70,6 +143,15 @@ class Query(graphene.ObjectType):
     def resolve_users(self, info, **kwargs):
         return User.objects.all()
 
+    def resolve_me(self, info, **kwargs):
+        return auth.request_user(info.context)
+
+    def resolve_saved_searches(self, info, **kwargs):
+        return SavedSearch.objects.filter(user_id=kwargs.get('userID')).order_by('pk')
+
+    def resolve_search_matches(self, info, **kwargs):
+        return savedsearches.pending_matches(kwargs.get('userID'))
+
     def resolve_listings(self, info, **kwargs):
         '''
         Return istings filtered based off the optional parameters passed.
@@ -86,7 +168,11 @@ class Query(graphene.ObjectType):
         10. university (String): if the user's university matches the given university
         11. categories (Array of strings): if any of the listing's categories matches any of the given categories.
 
-        If none of the parameters are passed, all of the listings will be returned
+        If none of the parameters are passed, all of the listings will be returned.
+        Archived listings are included when asking for sold listings or for
+        the listings of a user.
+        The newest `first` listings after `offset` are returned (all by default),
+        sliced in SQL.
         '''
 
         # initialize the query set
@@ -108,8 +194,11 @@ class Query(graphene.ObjectType):
         user_email = kwargs.get('userEmail')
 
         # if no parameters are passed, return all the listings
+        first = kwargs.get('first')
+        offset = max(kwargs.get('offset') or 0, 0)
+        page = slice(offset, None if first is None else offset + max(first, 0))
         if not any([item_name, max_price, min_price, negotiable, condition, location, date_created, user_id, university, categories, user_email]) and sold is None:
-            return Listing.objects.order_by('-date_created').all()
+            return Listing.objects.order_by('-date_created').all()[page]
 
 
         # otherwise filter the query set
@@ -127,6 +216,7 @@ class Query(graphene.ObjectType):
             listing_objects = listing_objects.filter(location=location)
         if date_created is not None:
             listing_objects = listing_objects.filter(date_created=date_created)
+        time_threshold = None
         if timeframe is not None:
             time_threshold = datetime.now() - timedelta(hours=timeframe)
             listing_objects = listing_objects.filter(date_created__gte=time_threshold)
@@ -141,13 +231,38 @@ class Query(graphene.ObjectType):
         if user_email is not None:
             listing_objects = listing_objects.filter(user__email=user_email)
 
-        return listing_objects.order_by('-date_created').distinct()
+        listing_objects = listing_objects.order_by('-date_created').distinct()
+
+        # sold listings may have been moved to the archive tables
+        if sold is True or (sold is None and (user_id is not None or user_email is not None)):
+            archived = archive.archived_listings(
+                item_name=item_name, max_price=max_price, min_price=min_price, negotiable=negotiable,
+                condition=condition, location=location, date_created=date_created,
+                created_after=time_threshold, user_id=user_id, university=university,
+                categories=categories, user_email=user_email
+            )
+            if archived.exists():
+                return archive.MergedListings(listing_objects, archived)[page]
+
+        return listing_objects[page]
+
+    def resolve_recommended_listings(self, info, **kwargs):
+        ''' Listings similar to the user's own listings, read from the precomputed neighbor table. '''
+        return recommendations.recommend(kwargs.get('userID'), kwargs.get('first'))
+
+    def resolve_trending_listings(self, info, **kwargs):
+        ''' Read from the ListingStats rows the view tracking flushes. '''
+        return viewtracking.trending(kwargs.get('university'), kwargs.get('first'))
+
+    def resolve_price_stats(self, info, **kwargs):
+        ''' Served from the PriceSummary rows, the Listing table is not scanned. '''
+        return PriceStatsType(**pricestats.price_stats(**kwargs))
 
     def resolve_categories(self, info, **kwargs):
-        return Category.objects.all()
+        return Category.objects.filter(listing__deleted_at__isnull=True)
     
     def resolve_images(self, info, **kwargs):
-        return Image.objects.all()
+        return Image.objects.exclude(listing__deleted_at__isnull=False)
 
     def resolve_chats(self, info, **kwargs):
         ''' Return a list of chats a given user is in (through email or user ID)'''
@@ -186,7 +301,13 @@ class Query(graphene.ObjectType):
         id = kwargs.get('id')
 
         if id is not None:
-            return Listing.objects.get(id=id)
+            try:
+                listing = Listing.objects.get(id=id)
+                # buffered, costs no query (see viewtracking.py)
+                viewtracking.record_view(listing.pk, getattr(info.context, 'cbay_user_id', None))
+                return listing
+            except Listing.DoesNotExist:
+                return ArchivedListing.objects.get(id=id).as_listing()
         
         return None
 
@@ -208,6 +329,9 @@ class UserInput(graphene.InputObjectType):
     thumbs_down = graphene.Int(default_value=0)
     bio = graphene.String()
     classification = graphene.String()
+    password = graphene.String()
+    # version the client last read, updates fail if the user changed since
+    version = graphene.Int()
 
 class ListingInput(graphene.InputObjectType):
     id = graphene.ID()
@@ -218,10 +342,12 @@ class ListingInput(graphene.InputObjectType):
     description = graphene.String(default_value="")
     location = graphene.String()
     date_created = graphene.DateTime()
-    sold = graphene.Boolean(default_value=False)
+    sold = graphene.Boolean()
     user_id = graphene.ID()
     images = graphene.List(of_type=String)
     categories = graphene.List(of_type=String)
+    # version the client last read, updates fail if the listing changed since
+    version = graphene.Int()
 
 class ImageInput(graphene.InputObjectType):
     images = graphene.List(of_type=String)
@@ -230,6 +356,15 @@ class ImageInput(graphene.InputObjectType):
 class ChatInput(graphene.InputObjectType):
     chat_id = graphene.String()
     user_emails = graphene.List(of_type=String)
+
+class SavedSearchInput(graphene.InputObjectType):
+    user_id = graphene.Int(required=True)
+    name = graphene.String()
+    category = graphene.String()
+    university = graphene.String()
+    condition = graphene.String()
+    min_price = graphene.Decimal()
+    max_price = graphene.Decimal()
     
 
 # USER mutations
@@ -262,8 +397,11 @@ class CreateUser(graphene.Mutation):
             bio = input.bio,
             classification = input.classification
         )
+        if input.password:
+            user_instance.set_password(input.password)
 
         user_instance.save()
+        bump_data_version()
         return CreateUser(ok=ok, user=user_instance)
 
 class UpdateUser(graphene.Mutation):
@@ -281,16 +419,29 @@ class UpdateUser(graphene.Mutation):
         if not user_instance:
             return UpdateUser(ok=ok, user=None)
         
+        # only the user themselves (authenticated with a token) may change
+        # their password
+        if input.password:
+            current_user = auth.request_user(info.context)
+            if current_user is None or current_user.pk != user_instance.pk:
+                return UpdateUser(ok=False, user=None)
+
         ok = True
-        if input.email: user_instance.email = input.email
-        if input.first_name: user_instance.first_name = input.first_name
-        if input.last_name: user_instance.last_name = input.last_name
-        if input.university: user_instance.university = input.university
-        if input.thumbs_up: user_instance.thumbs_up = input.thumbs_up
-        if input.thumbs_down: user_instance.thumbs_down = input.thumbs_down
-        if input.bio: user_instance.bio = input.bio
-        if input.classification: user_instance.classification = input.classification
-        user_instance.save()
+        changes = {}
+        if input.email: changes['email'] = input.email
+        if input.first_name: changes['first_name'] = input.first_name
+        if input.last_name: changes['last_name'] = input.last_name
+        if input.university: changes['university'] = input.university
+        if input.thumbs_up: changes['thumbs_up'] = input.thumbs_up
+        if input.thumbs_down: changes['thumbs_down'] = input.thumbs_down
+        if input.bio: changes['bio'] = input.bio
+        if input.classification: changes['classification'] = input.classification
+        if input.password: changes['password'] = make_password(input.password)
+
+        # single UPDATE of the changed columns, raises a conflict error
+        # if the user was updated by someone else in the meantime
+        if save_changes(user_instance, changes, input.version):
+            bump_data_version()
         return UpdateUser(ok=ok, user=user_instance)
 
 class DeleteUser(graphene.Mutation):
@@ -301,12 +452,42 @@ class DeleteUser(graphene.Mutation):
 
     @staticmethod
     def mutate(root, info, id):
-        ok = True
-        user_instance = User.objects.get(pk=id)
-        user_instance.delete()
+        # Soft delete: the user and their listings are only marked as deleted
+        # (two UPDATE statements, no cascade). The purge_deleted command
+        # removes the rows later in small batches.
+        now = timezone.now()
+        ok = User.objects.filter(pk=id).update(deleted_at=now) > 0
+        if ok:
+            Listing.objects.filter(user_id=id).update(deleted_at=now)
+            bump_data_version()
         return DeleteUser(ok=ok)
 
 
+class ObtainToken(graphene.Mutation):
+    '''
+    Exchange the email and password of a user for a signed token, sent back
+    as `Authorization: Bearer <token>` (see auth.py). token and user are null
+    if the email or the password is wrong, or the user has no password.
+    '''
+    class Arguments:
+        email = graphene.String(required=True)
+        password = graphene.String(required=True)
+
+    token = graphene.String()
+    user = graphene.Field(UserType)
+
+    @staticmethod
+    def mutate(root, info, email, password):
+        user_instance = User.objects.filter(email=email).first()
+        if user_instance is None:
+            # hash anyway, so unknown emails can't be told apart by the response time
+            make_password(password)
+            return ObtainToken(token=None, user=None)
+        if not user_instance.check_password(password):
+            return ObtainToken(token=None, user=None)
+        return ObtainToken(token=auth.create_token(user_instance), user=user_instance)
+
+
 # Listing mutations
 class CreateListing(graphene.Mutation):
     # Pass in the input class created above to specify
@@ -340,19 +521,29 @@ class CreateListing(graphene.Mutation):
             description = input.description,
             location = input.location,
             date_created = input.date_created,
-            sold = input.sold,
+            sold = bool(input.sold),
             user = user
         )
-        listing_instance.save()
-        
-        # Now create images and categories for the listing
-        for image_url in input.images:
-            image = Image(image_url=image_url, listing=listing_instance)
-            image.save()
+        # the listing, its stats and its tasks are written in one transaction:
+        # the worker only sees the tasks once the listing is committed
+        with transaction.atomic():
+            listing_instance.save()
+
+            # Now create images and categories for the listing
+            for image_url in input.images:
+                image = Image(image_url=image_url, listing=listing_instance)
+                image.save()
+
+            for category_name in input.categories:
+                category = Category(category_name=category_name, listing=listing_instance)
+                category.save()
+
+            pricestats.add(pricestats.snapshot(listing_instance))
+            bump_data_version()
 
-        for category_name in input.categories:
-            category = Category(category_name=category_name, listing=listing_instance)
-            category.save()
+            # side effects the response doesn't need, run by the task worker
+            recommendations.refresh_listings.delay(listing_instance.pk)
+            savedsearches.match_listing.delay(listing_instance.pk)
 
         # return the newly created instance
         return CreateListing(ok=ok, listing=listing_instance)
@@ -373,16 +564,18 @@ class UpdateListing(graphene.Mutation):
             return UpdateListing(ok=ok, listing=None)
 
         ok = True
-
-        # Update the respective fields
-        if input.item_name: listing_instance.item_name = input.item_name
-        if input.price: listing_instance.price = input.price
-        if input.negotiable: listing_instance.negotiable = input.negotiable
-        if input.condition: listing_instance.condition = input.condition
-        if input.description: listing_instance.description = input.description
-        if input.location: listing_instance.location = input.location
-        if input.date_created: listing_instance.date_created = input.date_created
-        if input.sold is not None: listing_instance.sold = input.sold
+        old_stats = pricestats.snapshot(listing_instance)
+
+        # Collect the respective fields
+        changes = {}
+        if input.item_name: changes['item_name'] = input.item_name
+        if input.price: changes['price'] = input.price
+        if input.negotiable is not None: changes['negotiable'] = input.negotiable
+        if input.condition: changes['condition'] = input.condition
+        if input.description: changes['description'] = input.description
+        if input.location: changes['location'] = input.location
+        if input.date_created: changes['date_created'] = input.date_created
+        if input.sold is not None: changes['sold'] = input.sold
         
         # Update the user if a new user ID is provided
         if input.user_id:
@@ -390,36 +583,38 @@ class UpdateListing(graphene.Mutation):
             if not new_user:
                 ok = False
                 return UpdateListing(ok=ok, listing=None)
-            listing_instance.user = new_user
-
-        # save the updated instance
-        listing_instance.save()
-
-        # Update the new images
-        # first set the current images to NULL
-        if input.images:
-            for image in Image.objects.filter(listing=listing_instance):
-                image.listing = None
-                image.save()
-
-        # then re-assign the new images
-        if input.images:
-            for image_url in input.images:
-                image, created = Image.objects.get_or_create(image_url=image_url)
-                image.listing = listing_instance
-                image.save()
-        
-        # Update the new categories
-        # first delete the current categories
-        if input.categories:
-            for category in Category.objects.filter(listing=listing_instance):
-                category.delete()
-
-        # then re-assign the new categories
-        if input.categories:
-            for category_name in input.categories:
-                Category.objects.get_or_create(category_name=category_name, listing=listing_instance)
-
+            changes['user'] = new_user
+
+        with transaction.atomic():
+            # single UPDATE of the changed columns, raises a conflict error (and
+            # rolls back) if the listing was updated by someone else meanwhile.
+            # New images or categories count as a change of the listing.
+            changed = save_changes(listing_instance, changes, input.version,
+                force=bool(input.images or input.categories))
+
+            # Update the new images
+            # first detach the current images, then attach the new ones
+            if input.images:
+                Image.objects.filter(listing=listing_instance).update(listing=None)
+                for image_url in input.images:
+                    Image.objects.update_or_create(image_url=image_url, defaults={'listing': listing_instance})
+
+            # Update the new categories
+            # first delete the current categories, then create the new ones
+            if input.categories:
+                Category.objects.filter(listing=listing_instance).delete()
+                Category.objects.bulk_create([
+                    Category(category_name=category_name, listing=listing_instance)
+                    for category_name in dict.fromkeys(input.categories)
+                ])
+
+            if changed:
+                pricestats.update(old_stats, pricestats.snapshot(listing_instance))
+                bump_data_version()
+                # sold listings drop out of the recommendations, edited ones get
+                # new neighbors, both in the background (see tasks.py)
+                recommendations.refresh_listings.delay(listing_instance.pk)
+                savedsearches.match_listing.delay(listing_instance.pk)
         return UpdateListing(ok=ok, listing=listing_instance)
 
 class DeleteListing(graphene.Mutation):
@@ -430,9 +625,10 @@ class DeleteListing(graphene.Mutation):
 
     @staticmethod
     def mutate(root, info, id, input=None):
-        ok = True
-        listing_instance = Listing.objects.get(pk=id)
-        listing_instance.delete()
+        # Soft delete, see DeleteUser
+        ok = Listing.objects.filter(pk=id).update(deleted_at=timezone.now()) > 0
+        if ok:
+            bump_data_version()
         return DeleteListing(ok=ok)
 
 # Image mutations
@@ -463,6 +659,7 @@ class CreateImages(graphene.Mutation):
             image_instance =  Image(image_url=image_url, listing=listing)
             image_instance.save()
             images_created.append(image_instance)
+        bump_data_version()
         
         # return the created images
         return CreateImages(ok=ok, images=images_created)
@@ -482,6 +679,7 @@ class DeleteImages(graphene.Mutation):
             image = Image.objects.get(image_url=image_url)
             image.listing = None
             image.save()
+        bump_data_version()
 
 # Chat mutations
 class CreateChat(graphene.Mutation):
@@ -505,15 +703,71 @@ class CreateChat(graphene.Mutation):
             user = User.objects.filter(email__exact=user_email)[0]
             chat_instance.users.add(user)
             
-        
+        bump_data_version()
         return CreateChat(ok=ok, chat=chat_instance)
         
 
 
+# Saved search mutations
+class CreateSavedSearch(graphene.Mutation):
+    class Arguments:
+        input = SavedSearchInput(required=True)
+
+    ok = graphene.Boolean()
+    saved_search = graphene.Field(SavedSearchType)
+
+    @staticmethod
+    def mutate(root, info, input):
+        if not User.objects.filter(pk=input.user_id).exists():
+            return CreateSavedSearch(ok=False, saved_search=None)
+
+        saved_search = SavedSearch.objects.create(
+            user_id = input.user_id,
+            name = input.name or '',
+            category = input.category or None,
+            university = savedsearches.normalize_university(input.university),
+            condition = input.condition or None,
+            min_price = input.min_price,
+            max_price = input.max_price
+        )
+        bump_data_version()
+        return CreateSavedSearch(ok=True, saved_search=saved_search)
+
+class DeleteSavedSearch(graphene.Mutation):
+    class Arguments:
+        id = graphene.Int(required=True)
+
+    ok = graphene.Boolean()
+
+    @staticmethod
+    def mutate(root, info, id):
+        deleted, _ = SavedSearch.objects.filter(pk=id).delete()
+        if deleted:
+            bump_data_version()
+        return DeleteSavedSearch(ok=deleted > 0)
+
+class MarkSearchMatchesDelivered(graphene.Mutation):
+    # Acknowledge the matches a client has shown, all of them if ids is not given
+    class Arguments:
+        user_id = graphene.Int(required=True)
+        ids = graphene.List(of_type=graphene.Int)
+
+    ok = graphene.Boolean()
+    count = graphene.Int()
+
+    @staticmethod
+    def mutate(root, info, user_id, ids=None):
+        count = savedsearches.mark_delivered(user_id, ids)
+        if count:
+            bump_data_version()
+        return MarkSearchMatchesDelivered(ok=True, count=count)
+
+
 class Mutation(graphene.ObjectType):
     create_user = CreateUser.Field()
     update_user = UpdateUser.Field()
     delete_user = DeleteUser.Field()
+    obtain_token = ObtainToken.Field()
 
     create_listing = CreateListing.Field()
     update_listing = UpdateListing.Field()
@@ -524,5 +778,7 @@ class Mutation(graphene.ObjectType):
 
     creat_chat = CreateChat.Field()
 
-# Creating the schema
-schema = graphene.Schema(query=Query, mutation=Mutation)
+    create_saved_search = CreateSavedSearch.Field()
+    delete_saved_search = DeleteSavedSearch.Field()
+    mark_search_matches_delivered = MarkSearchMatchesDelivered.Field()
+
@@ -0,0 +1,238 @@
+'''
+Background task queue, backed by the Task table (no broker needed).
+
+Register a function with @task() and call f.delay(*args) from a mutation
+instead of running the side effect inline. Call it inside the mutation's
+transaction.atomic() block: the Task row is then written in the same
+transaction, so the task only becomes visible to the workers when the
+mutation commits, and disappears if it rolls back. (Requests are not atomic
+by default, outside of a block the row is committed right away.)
+
+`python manage.py run_tasks` is the worker. It claims due tasks in batches
+(with SKIP LOCKED on Postgres, so several workers can run side by side),
+runs them, retries failures with exponential backoff up to max_attempts and
+hands tasks of a worker that died (locked_until passed) to another one. The
+lock of each task is renewed right before it runs.
+Tasks registered with batch=True get all the calls claimed in one batch at
+once, to share the work between them.
+'''
+import logging
+import time
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# seconds a worker may hold a task before it is handed to another worker
+LOCK_TIMEOUT = 300
+# seconds before the first retry, doubled at every attempt
+RETRY_DELAY = 10
+# finished tasks are kept that long for the metrics
+KEEP_FINISHED = timedelta(days=7)
+
+registry = {}
+
+
+def task(max_attempts=3, batch=False):
+    '''
+    Register a function as a task: func.delay(*args) enqueues a call (the
+    arguments must be JSON serializable). Batch tasks are called with the
+    list of the argument lists of the pending calls instead.
+    '''
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        registry[name] = func
+        func.task_name = name
+        func.batch = batch
+        func.delay = lambda *args: enqueue(name, args, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, args=(), max_attempts=3):
+    return Task.objects.create(name=name, args=list(args), max_attempts=max_attempts, run_at=timezone.now())
+
+
+def get_task(name):
+    # importing the function's module registers it
+    if name not in registry:
+        import_string(name)
+    return registry[name]
+
+
+def requeue_abandoned():
+    '''
+    Queue again the tasks of workers that died while running them, unless
+    they used up their attempts: a task that kills its worker (out of memory,
+    timeout) would otherwise be retried forever. Returns how many were queued.
+    '''
+    now = timezone.now()
+    abandoned = Task.objects.filter(status=Task.RUNNING, locked_until__lt=now)
+    abandoned.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_at=now, locked_until=None,
+        last_error="The worker running the task died or timed out.",
+    )
+    return abandoned.update(status=Task.QUEUED, run_at=now, locked_until=None)
+
+
+def claim(batch_size):
+    ''' Mark up to batch_size due tasks as running and return them. '''
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=LOCK_TIMEOUT)
+    with transaction.atomic():
+        due = Task.objects.filter(status=Task.QUEUED, run_at__lte=now).order_by('run_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        tasks = list(due[:batch_size])
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status=Task.RUNNING,
+            started_at=now,
+            locked_until=locked_until,
+            attempts=F('attempts') + 1,
+        )
+    for task in tasks:
+        task.attempts += 1
+        task.status = Task.RUNNING
+        task.locked_until = locked_until
+    return tasks
+
+
+def extend_lock(tasks):
+    '''
+    Renew the lock of claimed tasks right before running them, so a long
+    batch doesn't see its last tasks handed to another worker. Returns the
+    tasks still held: those whose lock expired and were requeued meanwhile
+    are left to whoever has them now.
+    '''
+    locked_until = timezone.now() + timedelta(seconds=LOCK_TIMEOUT)
+    held = []
+    for task in tasks:
+        if Task.objects.filter(pk=task.pk, status=Task.RUNNING, locked_until=task.locked_until).update(locked_until=locked_until):
+            task.locked_until = locked_until
+            held.append(task)
+    return held
+
+
+def finish(tasks, error=None):
+    now = timezone.now()
+    if error is None:
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status=Task.DONE, finished_at=now, locked_until=None, last_error=''
+        )
+        return
+
+    for task in tasks:
+        if task.attempts >= task.max_attempts:
+            changes = {'status': Task.FAILED, 'finished_at': now}
+        else:
+            delay = RETRY_DELAY * 2 ** (task.attempts - 1)
+            changes = {'status': Task.QUEUED, 'run_at': now + timedelta(seconds=delay)}
+        Task.objects.filter(pk=task.pk).update(locked_until=None, last_error=error[-5000:], **changes)
+
+
+def call(tasks, func):
+    try:
+        with transaction.atomic():
+            if func.batch:
+                func([task.args for task in tasks])
+            else:
+                func(*tasks[0].args)
+    except Exception:
+        logger.exception("task %s failed", tasks[0].name)
+        finish(tasks, traceback.format_exc())
+    else:
+        finish(tasks)
+
+
+def run_pending(batch_size=100):
+    ''' Claim and run one batch of due tasks. Returns the number of tasks run. '''
+    requeue_abandoned()
+    tasks = claim(batch_size)
+    groups = defaultdict(list)
+    for task in tasks:
+        groups[task.name].append(task)
+
+    for name, group in groups.items():
+        try:
+            func = get_task(name)
+        except (ImportError, KeyError):
+            logger.exception("unknown task %s", name)
+            finish(group, traceback.format_exc())
+            continue
+        if func.batch:
+            group = extend_lock(group)
+            if group:
+                call(group, func)
+        else:
+            for task in group:
+                if extend_lock([task]):
+                    call([task], func)
+    return len(tasks)
+
+
+def purge_finished(older_than=KEEP_FINISHED):
+    ''' Delete the tasks that succeeded more than `older_than` ago. '''
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def work(batch_size=100, sleep=1.0, once=False, should_stop=lambda: False):
+    '''
+    Worker loop: run batches of due tasks, sleeping `sleep` seconds when there
+    are none. With once=True, return as soon as no task is due.
+    Returns the number of tasks run.
+    '''
+    total = 0
+    last_purge = None
+    while not should_stop():
+        ran = run_pending(batch_size)
+        total += ran
+        if last_purge is None or time.monotonic() - last_purge > 3600:
+            purge_finished()
+            last_purge = time.monotonic()
+        if not ran:
+            if once:
+                break
+            time.sleep(sleep)
+    return total
+
+
+def stats(window=timedelta(hours=1), sample=1000):
+    '''
+    Queue metrics: the number of tasks per status, the age of the oldest due
+    task, and per task name the count, mean wait (queued -> started) and
+    mean run time of the tasks finished in the last `window`.
+    '''
+    now = timezone.now()
+    depth = {status: 0 for status, label in Task.STATUSES}
+    depth.update(Task.objects.values_list('status').annotate(count=Count('id')).order_by())
+    oldest = Task.objects.filter(status=Task.QUEUED, run_at__lte=now).aggregate(oldest=Min('created_at'))['oldest']
+
+    finished = defaultdict(lambda: {'count': 0, 'wait': 0.0, 'run': 0.0})
+    recent = (
+        Task.objects.filter(status=Task.DONE, finished_at__gte=now - window)
+            .order_by('-finished_at')
+            .values_list('name', 'created_at', 'started_at', 'finished_at')[:sample]
+    )
+    for name, created_at, started_at, finished_at in recent:
+        metrics = finished[name]
+        metrics['count'] += 1
+        metrics['wait'] += (started_at - created_at).total_seconds()
+        metrics['run'] += (finished_at - started_at).total_seconds()
+    for metrics in finished.values():
+        metrics['wait'] /= metrics['count']
+        metrics['run'] /= metrics['count']
+
+    return {
+        'depth': depth,
+        'oldest_due_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+        'finished': dict(finished),
+    }
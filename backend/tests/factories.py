@@ -0,0 +1,58 @@
+'''
+Factories for the test data: every make_* function creates a valid row with
+unique values where they have to be unique. Pass any field to override it.
+'''
+import itertools
+from decimal import Decimal
+
+from django.utils import timezone
+
+from backend.models import Category, Chat, Image, Listing, User
+
+sequence = itertools.count(1)
+
+
+def make_user(**fields):
+    n = next(sequence)
+    fields.setdefault('email', f'student{n}@tamu.edu')
+    fields.setdefault('first_name', 'Test')
+    fields.setdefault('last_name', f'Student{n}')
+    fields.setdefault('university', 'TAMU')
+    return User.objects.create(**fields)
+
+
+def make_listing(user=None, categories=(), images=0, **fields):
+    '''
+    A listing of `user` (a new one by default), with a category per name in
+    `categories` and `images` images.
+    '''
+    n = next(sequence)
+    fields.setdefault('item_name', f'Item {n}')
+    fields.setdefault('price', Decimal('10.00'))
+    fields.setdefault('negotiable', False)
+    fields.setdefault('condition', 'used')
+    fields.setdefault('location', 'campus')
+    fields.setdefault('date_created', timezone.now())
+    listing = Listing.objects.create(user=user or make_user(), **fields)
+    for name in categories:
+        make_category(listing, category_name=name)
+    for _ in range(images):
+        make_image(listing)
+    return listing
+
+
+def make_category(listing=None, **fields):
+    fields.setdefault('category_name', 'books')
+    return Category.objects.create(listing=listing or make_listing(), **fields)
+
+
+def make_image(listing=None, **fields):
+    fields.setdefault('image_url', f'https://img.example.com/{next(sequence)}.png')
+    return Image.objects.create(listing=listing if listing is not None else make_listing(), **fields)
+
+
+def make_chat(users=None, **fields):
+    fields.setdefault('chat_id', f'chat-{next(sequence)}')
+    chat = Chat.objects.create(**fields)
+    chat.users.set(users if users is not None else [make_user(), make_user()])
+    return chat
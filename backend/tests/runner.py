@@ -0,0 +1,13 @@
+from django.test.runner import DiscoverRunner, default_test_processes
+
+
+class ParallelTestRunner(DiscoverRunner):
+    '''
+    Run the tests in parallel on every core by default. Use `--parallel 1`
+    (or the DJANGO_TEST_PROCESSES environment variable) to change it.
+    '''
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(parallel=default_test_processes())
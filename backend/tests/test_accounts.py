@@ -0,0 +1,16 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from backend.models import User
+from backend.tests.factories import make_user
+
+
+class StudentAccountTestCase(TestCase):
+    def testNonStudentEmail(self) -> None:
+        user = User(email="nonstudent@gmail.com", first_name="Test", last_name="Case", university="TAMU", classification="Junior")
+        with self.assertRaises(ValidationError) as error:
+            user.full_clean()
+        self.assertEqual(list(error.exception.message_dict), ['email'])
+    def testStudentEmail(self):
+        user = User(email="student@tamu.edu", first_name="Test", last_name="Case", university="TAMU", classification="Junior")
+        user.full_clean()
+        self.assertIsNotNone(make_user(email="student@tamu.edu").pk)
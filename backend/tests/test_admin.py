@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from backend.models import Listing
+from backend.tests.factories import make_listing, make_user
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@tamu.edu', 'password')
+        self.client.force_login(admin_user)
+        self.seller = make_user()
+
+    def addListings(self, count):
+        for i in range(count):
+            make_listing(self.seller, item_name=f'Chair {i}', categories=['furniture'])
+
+    def changelistQueries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def testChangelistQueriesDontGrowWithRows(self):
+        for url in ('/admin/backend/listing/', '/admin/backend/category/'):
+            self.addListings(2)
+            few = self.changelistQueries(url)
+            self.addListings(20)
+            self.assertEqual(self.changelistQueries(url), few)
+
+    def testDeletedRowsAreListed(self):
+        self.addListings(1)
+        Listing.objects.update(deleted_at=timezone.now())
+        response = self.client.get('/admin/backend/listing/')
+        self.assertContains(response, 'Chair 0')
+
+    def testPrefixSearch(self):
+        self.addListings(12)
+        response = self.client.get('/admin/backend/listing/', {'q': 'Chair 1'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.client.get('/admin/backend/listing/', {'q': 'hair'})
+        self.assertEqual(response.context['cl'].result_count, 0)
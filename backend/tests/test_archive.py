@@ -0,0 +1,62 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from backend import archive
+from backend.models import ArchivedListing, Category, Image, Listing, User
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="seller@tamu.edu", first_name="Sell", last_name="Er", university="TAMU")
+        old = timezone.now() - timedelta(days=365)
+        for i in range(3):
+            listing = Listing.objects.create(item_name=f'Old {i}', price=10, negotiable=False, condition='used',
+                location='campus', sold=True, date_created=old + timedelta(days=i), user=self.user)
+            Category.objects.create(category_name='books', listing=listing)
+            Image.objects.create(image_url=f'https://img.example.com/{i}.png', listing=listing)
+        self.live = Listing.objects.create(item_name='New', price=10, negotiable=False, condition='used',
+            location='campus', date_created=timezone.now(), user=self.user)
+
+    def query(self, query):
+        response = self.client.post('/graphql/', {'query': query}, content_type='application/json')
+        return response.json()['data']
+
+    def testArchiveInBatches(self):
+        self.assertEqual(archive.archive(batch_size=2, max_batches=1), 2)
+        self.assertEqual(archive.archive(batch_size=2), 1)
+        self.assertEqual(list(Listing.objects.all()), [self.live])
+        self.assertEqual(ArchivedListing.objects.count(), 3)
+        self.assertEqual(Image.objects.count(), 0)
+        self.assertEqual(Category.objects.count(), 0)
+
+    def testSoldListingsIncludeArchive(self):
+        archive.archive()
+        listings = self.query('{ listings(sold: true) { itemName imageSet { imageUrl } categorySet { categoryName } } }')['listings']
+        self.assertEqual([listing['itemName'] for listing in listings], ['Old 2', 'Old 1', 'Old 0'])
+        self.assertEqual(listings[0]['imageSet'], [{'imageUrl': 'https://img.example.com/2.png'}])
+        self.assertEqual(listings[0]['categorySet'], [{'categoryName': 'books'}])
+
+    def testUserHistoryIncludesArchive(self):
+        archive.archive()
+        listings = self.query('{ listings(userID: %d) { itemName } }' % self.user.id)['listings']
+        self.assertEqual(len(listings), 4)
+        unsold = self.query('{ listings(userID: %d, sold: false) { itemName } }' % self.user.id)['listings']
+        self.assertEqual(unsold, [{'itemName': 'New'}])
+
+    def testPaginationSpansArchiveInSql(self):
+        archive.archive()
+        query = '{ listings(userID: %d, first: 2, offset: 1) { itemName imageSet { imageUrl } } }' % self.user.id
+        with CaptureQueriesContext(connection) as queries:
+            listings = self.query(query)['listings']
+        self.assertEqual([listing['itemName'] for listing in listings], ['Old 2', 'Old 1'])
+        self.assertEqual(listings[0]['imageSet'], [{'imageUrl': 'https://img.example.com/2.png'}])
+        union = [query['sql'] for query in queries if 'UNION' in query['sql']]
+        self.assertEqual(len(union), 1)
+        self.assertIn('LIMIT 2 OFFSET 1', union[0])
+
+    def testListingByIdFallsBackToArchive(self):
+        listing_id = Listing.objects.get(item_name='Old 0').id
+        archive.archive()
+        self.assertEqual(self.query('{ listing(id: %d) { itemName } }' % listing_id)['listing']['itemName'], 'Old 0')
@@ -0,0 +1,88 @@
+from unittest import mock
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from backend import auth, ratelimit
+from backend.tests.factories import make_user
+
+
+class TokenAuthTestCase(TestCase):
+    def setUp(self):
+        self.user = make_user(email="buyer@tamu.edu")
+        self.user.set_password("secret")
+        self.user.save()
+
+    def post(self, query, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.post('/graphql/', {'query': query}, content_type='application/json', **headers)
+
+    def testObtainTokenAndMe(self):
+        token = self.post('mutation { obtainToken(email: "buyer@tamu.edu", password: "secret") { token } }').json()['data']['obtainToken']['token']
+        self.assertEqual(self.post('{ me { email } }', token).json()['data']['me'], {'email': "buyer@tamu.edu"})
+        self.assertIsNone(self.post('{ me { email } }').json()['data']['me'])
+
+    def testObtainTokenNeedsPassword(self):
+        for arguments in ('email: "buyer@tamu.edu", password: "wrong"', 'email: "nobody@tamu.edu", password: "secret"'):
+            response = self.post('mutation { obtainToken(%s) { token user { email } } }' % arguments).json()
+            self.assertEqual(response['data']['obtainToken'], {'token': None, 'user': None})
+        self.assertIn('errors', self.post('mutation { obtainToken(email: "buyer@tamu.edu") { token } }').json())
+        make_user(email="nopassword@tamu.edu")
+        response = self.post('mutation { obtainToken(email: "nopassword@tamu.edu", password: "") { token } }').json()
+        self.assertIsNone(response['data']['obtainToken']['token'])
+
+    def testPasswordChangeNeedsTheUsersToken(self):
+        mutation = 'mutation { updateUser(id: %d, input: {password: "pwned"}) { ok } }' % self.user.pk
+        self.assertFalse(self.post(mutation).json()['data']['updateUser']['ok'])
+        other = make_user()
+        self.assertFalse(self.post(mutation, auth.create_token(other)).json()['data']['updateUser']['ok'])
+        response = self.post('mutation { obtainToken(email: "buyer@tamu.edu", password: "pwned") { token } }').json()
+        self.assertIsNone(response['data']['obtainToken']['token'])
+
+    def testPasswordChangeInvalidatesTokens(self):
+        token = auth.create_token(self.user)
+        mutation = 'mutation { updateUser(id: %d, input: {password: "changed"}) { ok } }' % self.user.pk
+        self.assertTrue(self.post(mutation, token).json()['data']['updateUser']['ok'])
+        self.assertIsNone(self.post('{ me { email } }', token).json()['data']['me'])
+        token = self.post('mutation { obtainToken(email: "buyer@tamu.edu", password: "changed") { token } }').json()['data']['obtainToken']['token']
+        self.assertEqual(self.post('{ me { email } }', token).json()['data']['me'], {'email': "buyer@tamu.edu"})
+
+    def testPasswordIsNotExposed(self):
+        response = self.post('{ users { password } }').json()
+        self.assertIn('errors', response)
+
+    def testNoSessionQueries(self):
+        token = auth.create_token(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post('{ me { email } }', token)
+        self.assertEqual(response.json()['data']['me'], {'email': "buyer@tamu.edu"})
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
+        # verifying the token itself costs no query, only loading the user does
+        self.assertEqual(len([query for query in queries if 'backend_user' in query['sql']]), 1)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+
+    def testInvalidToken(self):
+        response = self.post('{ me { email } }', auth.create_token(self.user) + 'x')
+        self.assertEqual(response.status_code, 401)
+
+    def testInvalidTokenHasCorsHeaders(self):
+        response = self.client.post('/graphql/', {'query': '{ me { email } }'}, content_type='application/json',
+                                    HTTP_AUTHORIZATION='Bearer x', HTTP_ORIGIN='http://localhost:4200')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Access-Control-Allow-Origin', response)
+
+    def testExpiredToken(self):
+        token = auth.create_token(self.user)
+        with override_settings(AUTH_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.post('{ me { email } }', token).status_code, 401)
+
+    def testUpdateIsSeenByNextRequest(self):
+        token = auth.create_token(self.user)
+        self.post('{ me { email } }', token)
+        self.post('mutation { updateUser(id: %d, input: {bio: "hello"}) { ok } }' % self.user.pk)
+        self.assertEqual(self.post('{ me { bio } }', token).json()['data']['me'], {'bio': "hello"})
+        self.post('mutation { deleteUser(id: %d) { ok } }' % self.user.pk)
+        self.assertIsNone(self.post('{ me { bio } }', token).json()['data']['me'])
+
+    def testRateLimitKeyIgnoresTokenUser(self):
+        request = mock.Mock(cbay_user_id=self.user.pk, META={'REMOTE_ADDR': '1.2.3.4'})
+        self.assertEqual(ratelimit.client_key(request, ratelimit.get_config()), 'ip:1.2.3.4')
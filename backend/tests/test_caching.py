@@ -0,0 +1,92 @@
+from django.test import TestCase, override_settings
+from backend import tasks
+from backend.caching import bump_data_version, get_data_version
+from backend.models import SavedSearch, SearchMatch, User
+from backend.tests.factories import make_listing, make_user
+
+
+class HttpCachingTestCase(TestCase):
+    QUERY = {'query': '{ users { email } }'}
+
+    def setUp(self):
+        User.objects.create(email="seller@tamu.edu", first_name="Test", last_name="Case", university="TAMU")
+
+    def get(self, params, **headers):
+        return self.client.get('/graphql/', params, HTTP_ACCEPT='application/json', **headers)
+
+    def testGetQueryHasETag(self):
+        response = self.get(self.QUERY)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def testMatchingETagReturnsNotModified(self):
+        etag = self.get(self.QUERY)['ETag']
+        response = self.get(self.QUERY, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def testMutationInvalidatesETag(self):
+        etag = self.get(self.QUERY)['ETag']
+        version = get_data_version()
+        self.client.post('/graphql/', {'query': 'mutation { updateUser(id: %d, input: {bio: "hi"}) { ok } }'
+            % User.objects.get().id}, content_type='application/json')
+        self.assertEqual(get_data_version(), version + 1)
+        response = self.get(self.QUERY, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def testSavedSearchMutationsInvalidateETag(self):
+        user = User.objects.get()
+        query = {'query': '{ savedSearches(userID: %d) { name } }' % user.id}
+
+        def post(mutation):
+            self.client.post('/graphql/', {'query': 'mutation { %s }' % mutation}, content_type='application/json')
+
+        etag = self.get(query)['ETag']
+        post('createSavedSearch(input: {userId: %d, name: "Desks"}) { ok }' % user.id)
+        response = self.get(query, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['savedSearches'], [{'name': "Desks"}])
+
+        search = SavedSearch.objects.get()
+        listing = make_listing(make_user())
+        SearchMatch.objects.create(saved_search=search, user=user, listing=listing)
+        matches = {'query': '{ searchMatches(userID: %d) { id } }' % user.id}
+        etag = self.get(matches)['ETag']
+        post('markSearchMatchesDelivered(userId: %d) { ok }' % user.id)
+        response = self.get(matches, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['searchMatches'], [])
+
+        etag = self.get(query)['ETag']
+        post('deleteSavedSearch(id: %d) { ok }' % search.id)
+        self.assertEqual(self.get(query, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def testTasksInvalidateETag(self):
+        buyer = User.objects.get()
+        make_listing(buyer, categories=['furniture'])
+        SavedSearch.objects.create(user=buyer, name="Furniture", category='furniture')
+        seller = make_user()
+        self.client.post('/graphql/', {'query': '''mutation { createListing(input: {itemName: "Shelf", price: "30",
+            negotiable: true, condition: "used", location: "campus", dateCreated: "2021-04-15T10:00:00+00:00",
+            userId: %d, images: [], categories: ["furniture"]}) { ok } }''' % seller.id}, content_type='application/json')
+        queries = [
+            {'query': '{ searchMatches(userID: %d) { id } }' % buyer.id},
+            {'query': '{ recommendedListings(userID: %d, first: 1) { itemName } }' % buyer.id},
+        ]
+        etags = [self.get(query)['ETag'] for query in queries]
+        tasks.run_pending()
+        for query, etag in zip(queries, etags):
+            self.assertEqual(self.get(query, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(GRAPHQL_CACHE_CONTROL={'OPERATIONS': {'Users': 'public, max-age=60'}})
+    def testCacheControlPerOperation(self):
+        response = self.get({'query': 'query Users { users { email } }', 'operationName': 'Users'})
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    def testPostIsNotCached(self):
+        bump_data_version()
+        response = self.client.post('/graphql/', self.QUERY, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
@@ -0,0 +1,50 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from backend.concurrency import save_changes
+from backend.models import Listing
+from backend.tests.factories import make_listing, make_user
+
+
+class OptimisticConcurrencyTestCase(TestCase):
+    def setUp(self):
+        self.user = make_user(first_name="Sell")
+        self.listing = make_listing(self.user, item_name='Lamp', price=15)
+
+    def post(self, mutation):
+        return self.client.post('/graphql/', {'query': mutation}, content_type='application/json').json()
+
+    def testUpdateBumpsVersion(self):
+        result = self.post('mutation { updateListing(id: %d, input: {price: "20", version: 0}) { listing { price version } } }' % self.listing.id)
+        self.assertEqual(result['data']['updateListing']['listing'], {'price': '20', 'version': 1})
+
+    def testStaleVersionIsRejected(self):
+        self.post('mutation { updateListing(id: %d, input: {price: "20", version: 0}) { ok } }' % self.listing.id)
+        result = self.post('mutation { updateListing(id: %d, input: {price: "25", version: 0}) { ok } }' % self.listing.id)
+        self.assertIn('modified by someone else', result['errors'][0]['message'])
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.price, 20)
+
+    def testOnlyChangedColumnsAreWritten(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post('mutation { updateUser(id: %d, input: {bio: "hi", firstName: "Sell"}) { ok } }' % self.user.id)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "backend_user"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"bio"', updates[0])
+        self.assertNotIn('"first_name"', updates[0])
+        self.assertNotIn('"email"', updates[0])
+
+    def testSoldIsKeptWhenNotGiven(self):
+        Listing.objects.filter(pk=self.listing.pk).update(sold=True)
+        self.post('mutation { updateListing(id: %d, input: {itemName: "Desk lamp"}) { ok } }' % self.listing.id)
+        self.listing.refresh_from_db()
+        self.assertTrue(self.listing.sold)
+
+    def testUpdateWithoutVersionAppliesOnTopOfConcurrentUpdate(self):
+        # simulate another update landing between the mutation's read and its write
+        listing = Listing.objects.get(pk=self.listing.pk)
+        Listing.objects.filter(pk=self.listing.pk).update(item_name='Desk lamp', version=1)
+        self.assertTrue(save_changes(listing, {'price': 20}))
+        self.assertEqual(listing.version, 2)
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.item_name, self.listing.price, self.listing.version), ('Desk lamp', 20, 2))
@@ -0,0 +1,60 @@
+import threading
+from django.test import SimpleTestCase
+from cbay.backends.postgresql_pool.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def makePool(self, **kwargs):
+        def ping(connection):
+            if not connection.alive:
+                raise ConnectionError("server closed the connection")
+        return ConnectionPool(connect=FakeConnection, ping=ping, **kwargs)
+
+    def testReusesReturnedConnection(self):
+        pool = self.makePool(max_size=2)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def testCheckoutTimesOutWhenExhausted(self):
+        pool = self.makePool(max_size=1, timeout=0.05)
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def testWaitsForCheckin(self):
+        pool = self.makePool(max_size=1, timeout=5)
+        connection = pool.checkout()
+        threading.Timer(0.05, pool.checkin, args=(connection,)).start()
+        self.assertIs(pool.checkout(), connection)
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def testPrePingDiscardsDeadConnection(self):
+        pool = self.makePool(max_size=1)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.alive = False
+        fresh = pool.checkout()
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        stats = pool.stats()
+        self.assertEqual(stats['ping_failures'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def testDiscardedConnectionFreesSlot(self):
+        pool = self.makePool(max_size=1, timeout=0.05)
+        connection = pool.checkout()
+        pool.checkin(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.checkout(), connection)
@@ -0,0 +1,81 @@
+import re
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from backend import archive, pricestats
+from backend.models import Category, Listing, PriceSummary, User
+
+
+class PriceStatsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="seller@tamu.edu", first_name="Sell", last_name="Er", university="TAMU")
+        for price in (10, 20, 30, 40, 100):
+            listing = Listing.objects.create(item_name='Book', price=price, negotiable=False,
+                condition='used', location='campus', user=self.user)
+            Category.objects.create(category_name='books', listing=listing)
+            Category.objects.create(category_name='school supplies', listing=listing)
+            pricestats.add(pricestats.snapshot(listing))
+
+    def testStats(self):
+        stats = pricestats.price_stats(category='books', university='tamu')
+        self.assertEqual(stats['count'], 5)
+        self.assertAlmostEqual(stats['mean'], 40.0)
+        self.assertAlmostEqual(stats['median'], 30.0, delta=30.0 * 0.025)
+        self.assertAlmostEqual(stats['p90'], 100.0, delta=100.0 * 0.025)
+
+    def testListingCountedOnceOverAllCategories(self):
+        self.assertEqual(pricestats.price_stats()['count'], 5)
+        self.assertEqual(pricestats.price_stats(condition='new')['count'], 0)
+
+    def testUpdateMovesListing(self):
+        listing = Listing.objects.first()
+        old = pricestats.snapshot(listing)
+        listing.sold = True
+        listing.save()
+        pricestats.update(old, pricestats.snapshot(listing))
+        self.assertEqual(pricestats.price_stats(sold=False)['count'], 4)
+        self.assertEqual(pricestats.price_stats(sold=True)['count'], 1)
+
+    def testUpdateLocksRowsInOrder(self):
+        listing = Listing.objects.first()
+        old = pricestats.snapshot(listing)
+        listing.sold = True
+        listing.save()
+        new = pricestats.snapshot(listing)
+        with CaptureQueriesContext(connection) as queries:
+            pricestats.update(old, new)
+        # the old and the new rows in one pass, ordered by category then sold
+        locked = [
+            (re.search(r'"category" = \'([^\']*)\'', query['sql']).group(1), 'NOT "backend_pricesummary"."sold"' not in query['sql'])
+            for query in queries if query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(locked, [(category, sold) for category in ('*', 'books', 'school supplies') for sold in (False, True)])
+
+    def testRebuildMatchesIncremental(self):
+        incremental = pricestats.price_stats(category='books')
+        pricestats.rebuild()
+        self.assertEqual(PriceSummary.objects.count(), 3)
+        self.assertEqual(pricestats.price_stats(category='books'), incremental)
+
+    def testRebuildCountsArchivedAndDeletedListings(self):
+        listings = list(Listing.objects.order_by('pk'))
+        for listing in listings[:2]:
+            old = pricestats.snapshot(listing)
+            listing.sold = True
+            listing.date_created = timezone.now() - timedelta(days=365)
+            listing.save()
+            pricestats.update(old, pricestats.snapshot(listing))
+        archive.archive()
+        listings[2].deleted_at = timezone.now()
+        listings[2].save()
+        incremental = [pricestats.price_stats(category='books', sold=sold) for sold in (True, False)]
+        self.assertEqual(incremental[0]['count'], 2)
+        pricestats.rebuild()
+        self.assertEqual([pricestats.price_stats(category='books', sold=sold) for sold in (True, False)], incremental)
+
+    def testPriceStatsQuery(self):
+        response = self.client.post('/graphql/', {'query': '{ priceStats(category: "books") { count mean } }'},
+            content_type='application/json')
+        self.assertEqual(response.json()['data']['priceStats'], {'count': 5, 'mean': 40.0})
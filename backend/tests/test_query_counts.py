@@ -0,0 +1,119 @@
+from backend import auth, pricestats, savedsearches, viewtracking
+from backend.models import SavedSearch
+from backend.caching import bump_data_version
+from backend.tests.factories import make_chat, make_listing, make_user
+from backend.tests.utils import GraphQLTestCase
+
+
+class QueryCountTestCase(GraphQLTestCase):
+    '''
+    Number of SQL queries of every GraphQL operation. A change here means a
+    resolver got slower (or faster: then lower the number).
+    '''
+
+    def setUp(self):
+        self.user = make_user(email="seller@tamu.edu")
+        self.listings = [make_listing(self.user, categories=['books'], images=1) for _ in range(3)]
+        for listing in self.listings:
+            pricestats.add(pricestats.snapshot(listing))
+        # the first bump creates the version row
+        bump_data_version()
+
+    def addListings(self):
+        for _ in range(5):
+            make_listing(self.user, categories=['books'], images=1)
+
+    def testUsers(self):
+        self.assertConstantGraphQLQueries('{ users { email firstName } }', lambda: make_user())
+
+    def testListings(self):
+        self.assertEqual(self.assertConstantGraphQLQueries('{ listings { itemName price } }', self.addListings), 1)
+
+    def testFilteredListings(self):
+        query = '{ listings(categories: ["books"], maxPrice: "20") { itemName } }'
+        self.assertEqual(self.assertConstantGraphQLQueries(query, self.addListings), 1)
+
+    def testListingsOfUser(self):
+        # also reads the archive tables
+        query = '{ listings(userID: %d) { itemName } }' % self.user.pk
+        self.assertEqual(self.assertConstantGraphQLQueries(query, self.addListings), 2)
+
+    def testListing(self):
+        self.assertGraphQLQueries(2, '{ listing(id: %d) { itemName user { email } } }' % self.listings[0].pk)
+
+    def testUser(self):
+        self.assertGraphQLQueries(1, '{ user(id: %d) { email } }' % self.user.pk)
+        self.assertGraphQLQueries(1, '{ user(email: "seller@tamu.edu") { email } }')
+
+    def testCategoriesAndImages(self):
+        self.assertEqual(self.assertConstantGraphQLQueries('{ categories { categoryName } }', self.addListings), 1)
+        self.assertEqual(self.assertConstantGraphQLQueries('{ images { imageUrl } }', self.addListings), 1)
+
+    def testChats(self):
+        make_chat([self.user, make_user()])
+        self.assertGraphQLQueries(2, '{ chats(email: "seller@tamu.edu") { chatId } }')
+
+    def testMe(self):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {auth.create_token(self.user)}'}
+        # the user is loaded once per request
+        self.assertGraphQLQueries(1, '{ me { email } second: me { bio } }', headers=headers)
+
+    def testPriceStats(self):
+        self.assertEqual(self.assertConstantGraphQLQueries('{ priceStats(category: "books") { count median } }', self.addListings), 1)
+
+    def testRecommendedListings(self):
+        query = '{ recommendedListings(userID: %d) { itemName } }' % make_user().pk
+        self.assertEqual(self.assertConstantGraphQLQueries(query, self.addListings), 3)
+
+    def testSearchMatches(self):
+        buyer = make_user()
+        SavedSearch.objects.create(user=buyer, category='books')
+        def addMatches():
+            for _ in range(3):
+                savedsearches.match_listing(make_listing(self.user, categories=['books']).pk)
+        addMatches()
+        query = '{ searchMatches(userID: %d) { listing { itemName } savedSearch { name } } }' % buyer.pk
+        self.assertEqual(self.assertConstantGraphQLQueries(query, addMatches), 1)
+        self.assertGraphQLQueries(1, '{ savedSearches(userID: %d) { category } }' % buyer.pk)
+
+    def testTrendingAndRecentlyViewed(self):
+        def addViews():
+            for listing in self.listings:
+                viewtracking.buffer.add(listing.pk, self.user.pk, listing.date_created)
+            viewtracking.flush()
+            self.addListings()
+        addViews()
+        self.assertEqual(self.assertConstantGraphQLQueries('{ trendingListings { itemName } }', addViews), 1)
+        query = '{ user(id: %d) { recentlyViewed { itemName } } }' % self.user.pk
+        self.assertEqual(self.assertConstantGraphQLQueries(query, addViews), 2)
+
+    def testCreateUser(self):
+        self.assertGraphQLQueries(2, '''mutation { createUser(input: {email: "new@tamu.edu", firstName: "New",
+            lastName: "User", university: "TAMU"}) { ok } }''')
+
+    def testUpdateUser(self):
+        # without a version the new version is read back after the update
+        self.assertGraphQLQueries(4, 'mutation { updateUser(id: %d, input: {bio: "hi"}) { ok } }' % self.user.pk)
+
+    def testCreateListing(self):
+        # includes the price stats and the savepoint of the mutation's transaction,
+        # the recommendations and saved searches are queued as tasks
+        self.assertGraphQLQueries(19, '''mutation { createListing(input: {itemName: "Desk", price: "30", negotiable: true,
+            condition: "used", location: "campus", dateCreated: "2021-04-01T00:00:00+00:00", userId: %d,
+            categories: ["furniture"], images: ["https://img.example.com/desk.png"]}) { ok } }''' % self.user.pk)
+
+    def testUpdateListing(self):
+        # includes the price stats and reading back the new version,
+        # the recommendations and saved searches are queued as tasks
+        self.assertGraphQLQueries(17, 'mutation { updateListing(id: %d, input: {price: "12"}) { ok } }' % self.listings[0].pk)
+
+    def testDeleteListing(self):
+        self.assertGraphQLQueries(2, 'mutation { deleteListing(id: %d) { ok } }' % self.listings[0].pk)
+
+    def testImages(self):
+        self.assertGraphQLQueries(3, 'mutation { createImages(input: {listingId: %d, images: ["https://img.example.com/a.png"]}) { ok } }' % self.listings[0].pk)
+        self.assertGraphQLQueries(3, 'mutation { deleteImages(images: ["https://img.example.com/a.png"]) { ok } }')
+
+    def testCreateChat(self):
+        make_user(email="buyer@tamu.edu")
+        self.assertGraphQLQueries(6, 'mutation { creatChat(input: {chatId: "c1", userEmails: ["seller@tamu.edu", "buyer@tamu.edu"]}) { ok } }')
@@ -0,0 +1,65 @@
+from django.test import TestCase, override_settings
+from backend import ratelimit
+
+
+class RateLimitTestCase(TestCase):
+    COSTS = ratelimit.DEFAULTS['COSTS']
+
+    def setUp(self):
+        ratelimit.memory_backend.clear()
+
+    def tearDown(self):
+        ratelimit.memory_backend.clear()
+
+    def testOperationCost(self):
+        self.assertEqual(ratelimit.operation_cost('{ user(id: 1) { email } }', self.COSTS), 1)
+        self.assertEqual(ratelimit.operation_cost('{ listings { id } users { id } }', self.COSTS), 10)
+        self.assertEqual(ratelimit.operation_cost('mutation { deleteUser(id: 1) { ok } }', self.COSTS), 10)
+        self.assertEqual(ratelimit.operation_cost('not graphql', self.COSTS), 1)
+
+    def testFragmentsAreExpanded(self):
+        query = 'query { ...F } fragment F on Query { listings { id } users { id } images { id } categories { id } }'
+        self.assertEqual(ratelimit.operation_cost(query, self.COSTS), 20)
+        query = 'query { ... on Query { listings { id } } ...A } fragment A on Query { ...B } fragment B on Query { users { id } ...A }'
+        self.assertEqual(ratelimit.operation_cost(query, self.COSTS), 10)
+
+    def testMutationsCostPerField(self):
+        query = '''mutation { a: deleteUser(id: 1) { ok } b: deleteUser(id: 2) { ok } c: deleteUser(id: 3) { ok } }'''
+        self.assertEqual(ratelimit.operation_cost(query, self.COSTS), 30)
+        self.assertEqual(ratelimit.operation_cost('{ a: listings { id } b: listings { id } }', self.COSTS), 10)
+
+    def testOnlySelectedOperationIsCounted(self):
+        query = 'query Small { user(id: 1) { email } } query Big { listings { id } users { id } }'
+        self.assertEqual(ratelimit.operation_cost(query, self.COSTS, 'Small'), 1)
+        self.assertEqual(ratelimit.operation_cost(query, self.COSTS, 'Big'), 10)
+
+    def testBucketRefills(self):
+        backend = ratelimit.MemoryBackend()
+        self.assertTrue(backend.consume('client', 5, rate=1000, burst=5)[0])
+        allowed, remaining, retry_after = backend.consume('client', 5, rate=1, burst=5)
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+
+    def testClientKeyBehindProxy(self):
+        request = self.client.request().wsgi_request
+        request.META['HTTP_X_FORWARDED_FOR'] = '10.0.0.1, 1.2.3.4'
+        self.assertEqual(ratelimit.client_key(request, {'NUM_PROXIES': 1}), 'ip:1.2.3.4')
+        self.assertEqual(ratelimit.client_key(request, {'NUM_PROXIES': 0}), 'ip:127.0.0.1')
+
+    @override_settings(GRAPHQL_RATE_LIMIT={'RATE': 0.001, 'BURST': 12})
+    def testReturns429WhenBucketIsEmpty(self):
+        query = {'query': '{ listings { id } }'}
+        for i in range(2):
+            response = self.client.post('/graphql/', query, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-RateLimit-Remaining'], '2')
+
+        response = self.client.post('/graphql/', query, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(GRAPHQL_RATE_LIMIT={'RATE': 0.001, 'BURST': 3})
+    def testCostIsCappedToBurst(self):
+        response = self.client.post('/graphql/', {'query': '{ listings { id } }'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
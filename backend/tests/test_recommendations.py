@@ -0,0 +1,87 @@
+from django.test import TestCase
+from backend import recommendations, tasks
+from backend.models import Category, Listing, ListingNeighbor, User
+
+
+class RecommendationsTestCase(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create(email="buyer@tamu.edu", first_name="Buy", last_name="Er", university="TAMU")
+        self.seller = User.objects.create(email="seller@tamu.edu", first_name="Sell", last_name="Er", university="TAMU")
+        self.other = User.objects.create(email="other@utexas.edu", first_name="Oth", last_name="Er", university="UT")
+        self.own = self.makeListing(self.buyer, 'Desk lamp', 20, ['furniture'])
+        self.similar = self.makeListing(self.seller, 'Desk', 25, ['furniture'])
+        self.unrelated = self.makeListing(self.other, 'Calculator', 90, ['school supplies'])
+
+    def makeListing(self, user, name, price, categories):
+        listing = Listing.objects.create(item_name=name, price=price, negotiable=False,
+            condition='used', location='campus', user=user)
+        for category in categories:
+            Category.objects.create(category_name=category, listing=listing)
+        return listing
+
+    def testRebuild(self):
+        recommendations.rebuild()
+        neighbors = ListingNeighbor.objects.filter(listing=self.own).values_list('neighbor', flat=True)
+        self.assertEqual(list(neighbors), [self.similar.id])
+        self.assertEqual(recommendations.recommend(self.buyer.id, 1), [self.similar])
+
+    def testSimilarityChunks(self):
+        self.makeListing(self.seller, 'Chair', 22, ['furniture', 'school supplies'])
+        features = recommendations.Features(recommendations.live_listings().order_by('pk'))
+        scores = recommendations.similarity(features, features)
+        self.assertEqual(scores.shape, (4, 4))
+        # desk lamp / chair: 1 of 2 categories, same university, same price band
+        self.assertAlmostEqual(scores[0, 3], 0.60 * 0.5 + 0.25 + 0.15, places=5)
+        self.assertEqual(scores[0, 2], 0.0)
+        for start in range(4):
+            self.assertTrue((recommendations.similarity(features, features, slice(start, start + 1)) == scores[start]).all())
+
+    def testRemovedNeighborIsReplaced(self):
+        chair = self.makeListing(self.other, 'Chair', 22, ['furniture'])
+        recommendations.rebuild(k=1)
+        self.assertEqual(list(ListingNeighbor.objects.filter(listing=self.own).values_list('neighbor', flat=True)), [self.similar.id])
+        self.similar.sold = True
+        self.similar.save()
+        recommendations.refresh_listing(self.similar, k=1)
+        self.assertEqual(list(ListingNeighbor.objects.filter(listing=self.own).values_list('neighbor', flat=True)), [chair.id])
+
+    def testRefreshNewListing(self):
+        recommendations.rebuild()
+        chair = self.makeListing(self.other, 'Chair', 22, ['furniture'])
+        recommendations.refresh_listing(chair)
+        self.assertIn(chair, recommendations.recommend(self.buyer.id, 5))
+        self.assertTrue(ListingNeighbor.objects.filter(listing=self.own, neighbor=chair).exists())
+
+    def testSoldListingIsRemoved(self):
+        recommendations.rebuild()
+        self.similar.sold = True
+        self.similar.save()
+        recommendations.refresh_listing(self.similar)
+        self.assertFalse(ListingNeighbor.objects.filter(neighbor=self.similar).exists())
+        self.assertNotIn(self.similar, recommendations.recommend(self.buyer.id, 5))
+
+    def testCreateListingMutationRefreshes(self):
+        mutation = '''mutation { createListing(input: {itemName: "Shelf", price: "30", negotiable: true,
+            condition: "used", location: "campus", dateCreated: "2021-04-15T10:00:00+00:00", userId: %d,
+            images: [], categories: ["furniture"]}) { ok listing { id } } }'''
+        response = self.client.post('/graphql/', {'query': mutation % self.seller.id}, content_type='application/json')
+        listing_id = int(response.json()['data']['createListing']['listing']['id'])
+        self.assertEqual(tasks.run_pending(), 2)
+        self.assertTrue(ListingNeighbor.objects.filter(listing=self.own, neighbor_id=listing_id).exists())
+
+    def testRecommendedListingsQuery(self):
+        recommendations.rebuild()
+        response = self.client.post('/graphql/', {'query': '{ recommendedListings(userID: %d, first: 2) { itemName } }'
+            % self.buyer.id}, content_type='application/json')
+        self.assertEqual(response.json()['data']['recommendedListings'][0]['itemName'], 'Desk')
+
+    def testFirstIsClamped(self):
+        recommendations.rebuild()
+        self.assertEqual(recommendations.recommend(self.buyer.id, -1), [])
+        for first in (-1, None):
+            response = self.client.post('/graphql/', {
+                'query': 'query ($first: Int) { recommendedListings(userID: %d, first: $first) { itemName } }' % self.buyer.id,
+                'variables': {'first': first},
+            }, content_type='application/json')
+            self.assertNotIn('errors', response.json())
+        self.assertEqual(response.json()['data']['recommendedListings'][0]['itemName'], 'Desk')
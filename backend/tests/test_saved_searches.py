@@ -0,0 +1,54 @@
+from backend import savedsearches, tasks
+from backend.models import SavedSearch, SearchMatch
+from backend.tests.factories import make_listing, make_user
+from backend.tests.utils import GraphQLTestCase
+
+
+class SavedSearchTestCase(GraphQLTestCase):
+    def setUp(self):
+        self.buyer = make_user(university="TAMU")
+        self.seller = make_user(university=" tamu ")
+        self.search = SavedSearch.objects.create(user=self.buyer, category='books', university='tamu', max_price=20)
+
+    def testMatchingPredicates(self):
+        cheap = make_listing(self.seller, categories=['books'], price=15)
+        expensive = make_listing(self.seller, categories=['books'], price=25)
+        furniture = make_listing(self.seller, categories=['furniture'], price=15)
+        elsewhere = make_listing(make_user(university="UT"), categories=['books'], price=15)
+        own = make_listing(self.buyer, categories=['books'], price=15)
+        for listing in (cheap, expensive, furniture, elsewhere, own):
+            savedsearches.match_listing(listing.pk)
+        self.assertEqual(list(SearchMatch.objects.values_list('listing', flat=True)), [cheap.pk])
+
+    def testEmptyFieldsMatchAnything(self):
+        anything = SavedSearch.objects.create(user=self.buyer)
+        listing = make_listing(self.seller, categories=['furniture'], price=500)
+        self.assertEqual(savedsearches.match_listing(listing.pk), 1)
+        self.assertEqual(SearchMatch.objects.get().saved_search, anything)
+
+    def testMatchedOnce(self):
+        listing = make_listing(self.seller, categories=['books'], price=15)
+        self.assertEqual(savedsearches.match_listing(listing.pk), 1)
+        self.assertEqual(savedsearches.match_listing(listing.pk), 0)
+
+    def testNotificationQueue(self):
+        listing = make_listing(self.seller, categories=['books'], price=15)
+        savedsearches.match_listing(listing.pk)
+        query = '{ searchMatches(userID: %d) { listing { itemName } savedSearch { category } } }' % self.buyer.pk
+        self.assertEqual(self.graphql(query)['searchMatches'], [{'listing': {'itemName': listing.item_name}, 'savedSearch': {'category': 'books'}}])
+        result = self.graphql('mutation { markSearchMatchesDelivered(userId: %d) { count } }' % self.buyer.pk)
+        self.assertEqual(result['markSearchMatchesDelivered']['count'], 1)
+        self.assertEqual(self.graphql(query)['searchMatches'], [])
+
+    def testCreateSavedSearch(self):
+        result = self.graphql('''mutation { createSavedSearch(input: {userId: %d, category: "lamps", university: " TAMU",
+            maxPrice: "30"}) { ok savedSearch { university } } }''' % self.buyer.pk)
+        self.assertEqual(result['createSavedSearch'], {'ok': True, 'savedSearch': {'university': 'tamu'}})
+
+    def testCreateListingQueuesMatching(self):
+        self.graphql('''mutation { createListing(input: {itemName: "Calculus", price: "15",
+            negotiable: false, condition: "used", location: "campus", dateCreated: "2021-04-01T00:00:00+00:00",
+            userId: %d, categories: ["books"], images: []}) { ok } }''' % self.seller.pk)
+        self.assertFalse(SearchMatch.objects.exists())
+        tasks.run_pending()
+        self.assertEqual(SearchMatch.objects.filter(user=self.buyer).count(), 1)
@@ -0,0 +1,32 @@
+import os
+from unittest import mock
+from django.test import SimpleTestCase
+from backend.management.commands.serve import cpu_count, default_workers
+from cbay.schema import get_schema
+from cbay.startup import measure_startup
+
+
+class ServeCommandTestCase(SimpleTestCase):
+    def testWorkersFromCpuCount(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(default_workers(), 2 * cpu_count() + 1)
+
+    def testWorkersFromWebConcurrency(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '3'}):
+            self.assertEqual(default_workers(), 3)
+
+
+class StartupTestCase(SimpleTestCase):
+    # Cold start budgets in seconds. They are generous on purpose (CI machines
+    # are slow), the point is to catch regressions like an eager schema build.
+    TOTAL_BUDGET = float(os.environ.get('STARTUP_BUDGET', 5.0))
+    SCHEMA_BUDGET = float(os.environ.get('SCHEMA_BUILD_BUDGET', 1.0))
+
+    def testSchemaIsBuiltOnce(self):
+        self.assertIs(get_schema(), get_schema())
+
+    def testStartupWithinBudget(self):
+        report = measure_startup()
+        self.assertFalse(report['schema_imported_by_urls'])
+        self.assertLess(report['schema_build'], self.SCHEMA_BUDGET)
+        self.assertLess(report['total'], self.TOTAL_BUDGET)
@@ -0,0 +1,57 @@
+from django.test import TestCase
+from django.utils import timezone
+from backend.caching import bump_data_version
+from backend import pricestats, purge
+from backend.models import Category, Image, Listing, User
+
+
+class SoftDeleteTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="seller@tamu.edu", first_name="Sell", last_name="Er", university="TAMU")
+        self.listings = []
+        for i in range(3):
+            listing = Listing.objects.create(item_name=f'Book {i}', price=10, negotiable=False, condition='used',
+                location='campus', date_created=timezone.now(), user=self.user)
+            Category.objects.create(category_name='books', listing=listing)
+            Image.objects.create(image_url=f'https://img.example.com/{i}.png', listing=listing)
+            pricestats.add(pricestats.snapshot(listing))
+            self.listings.append(listing)
+
+    def mutate(self, mutation):
+        response = self.client.post('/graphql/', {'query': mutation}, content_type='application/json')
+        return response.json()['data']
+
+    def testDeleteUserIsConstantQueries(self):
+        bump_data_version()
+        with self.assertNumQueries(3):
+            # user update, listings update, data version bump
+            self.assertTrue(self.mutate('mutation { deleteUser(id: %d) { ok } }' % self.user.id)['deleteUser']['ok'])
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Listing.objects.exists())
+        self.assertEqual(Listing.all_objects.count(), 3)
+
+    def testDeletedListingIsHidden(self):
+        self.mutate('mutation { deleteListing(id: %d) { ok } }' % self.listings[0].id)
+        listings = self.mutate('{ listings { itemName } }')['listings']
+        self.assertEqual(len(listings), 2)
+        self.assertEqual(len(self.mutate('{ categories { id } }')['categories']), 2)
+
+    def testEmailCanBeReusedAfterDelete(self):
+        self.mutate('mutation { deleteUser(id: %d) { ok } }' % self.user.id)
+        User.objects.create(email="seller@tamu.edu", first_name="New", last_name="Er", university="TAMU")
+        self.assertEqual(User.all_objects.filter(email="seller@tamu.edu").count(), 2)
+
+    def testPurgeInBatches(self):
+        self.mutate('mutation { deleteUser(id: %d) { ok } }' % self.user.id)
+        self.assertEqual(purge.purge(batch_size=2), (3, 1))
+        self.assertFalse(Listing.all_objects.exists())
+        self.assertFalse(User.all_objects.exists())
+        self.assertFalse(Category.objects.exists())
+        # images are kept for the storage cleanup, without a listing
+        self.assertEqual(Image.objects.filter(listing__isnull=True).count(), 3)
+        self.assertEqual(pricestats.price_stats()['count'], 0)
+
+    def testPurgeKeepsRecentDeletes(self):
+        self.mutate('mutation { deleteListing(id: %d) { ok } }' % self.listings[0].id)
+        self.assertEqual(purge.purge(grace_seconds=3600), (0, 0))
+        self.assertEqual(Listing.all_objects.count(), 3)
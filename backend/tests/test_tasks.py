@@ -0,0 +1,129 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+from django.utils import timezone
+from backend import savedsearches, tasks
+from backend.models import Listing, Task
+from backend.tests.factories import make_user
+
+calls = []
+
+
+@tasks.task(max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@tasks.task(batch=True)
+def record_batch(batch):
+    calls.append(sorted(args[0] for args in batch))
+
+
+@tasks.task(max_attempts=2)
+def explode():
+    raise ValueError("boom")
+
+
+class TaskQueueTestCase(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def testDelayAndRun(self):
+        record.delay('a')
+        record.delay('b')
+        self.assertEqual(calls, [])
+        self.assertEqual(tasks.run_pending(), 2)
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 2)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def testBatchTask(self):
+        for value in (3, 1, 2):
+            record_batch.delay(value)
+        tasks.run_pending()
+        self.assertEqual(calls, [[1, 2, 3]])
+
+    def testRolledBackMutationQueuesNothing(self):
+        try:
+            with transaction.atomic():
+                record.delay('a')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Task.objects.exists())
+
+    def testRetriesThenFails(self):
+        explode.delay()
+        tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertIn("boom", task.last_error)
+        # retried after the backoff delay only
+        self.assertEqual(tasks.run_pending(), 0)
+        Task.objects.update(run_at=timezone.now())
+        tasks.run_pending()
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def testAbandonedTaskIsRequeued(self):
+        record.delay('a')
+        tasks.claim(10)
+        self.assertEqual(tasks.run_pending(), 0)
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(calls, ['a'])
+
+    def testAbandonedTaskFailsAfterMaxAttempts(self):
+        record.delay('a')
+        for attempt in range(2):
+            tasks.claim(10)
+            Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+            tasks.requeue_abandoned()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertEqual(tasks.run_pending(), 0)
+        self.assertEqual(calls, [])
+
+    def testRequeuedTaskIsNotRunTwice(self):
+        record.delay('a')
+        stale = tasks.claim(10)
+        # the batch took too long: the task went to another worker
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(tasks.extend_lock(stale), [])
+        self.assertEqual(calls, ['a'])
+
+    def testUnknownTaskFails(self):
+        tasks.enqueue('backend.tests.test_tasks.missing', max_attempts=1)
+        tasks.run_pending()
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def testStats(self):
+        record.delay('a')
+        explode.delay()
+        tasks.run_pending()
+        stats = tasks.stats()
+        self.assertEqual(stats['depth'], {'queued': 1, 'running': 0, 'done': 1, 'failed': 0})
+        self.assertEqual(stats['finished'][record.task_name]['count'], 1)
+
+    def testWorkerCommand(self):
+        record.delay('a')
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn("Ran 1 tasks", out.getvalue())
+        call_command('run_tasks', '--stats', stdout=out)
+        self.assertIn("done 1", out.getvalue())
+
+    def testFailedMutationQueuesNoTask(self):
+        user = make_user()
+        mutation = '''mutation { createListing(input: {itemName: "Shelf", price: "30", negotiable: true,
+            condition: "used", location: "campus", dateCreated: "2021-04-15T10:00:00+00:00", userId: %d,
+            images: [], categories: ["furniture"]}) { ok } }''' % user.pk
+        # the second task can't be queued: the whole mutation rolls back
+        with mock.patch.object(savedsearches.match_listing, 'delay', side_effect=DatabaseError):
+            response = self.client.post('/graphql/', {'query': mutation}, content_type='application/json')
+        self.assertIn('errors', response.json())
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(Listing.objects.exists())
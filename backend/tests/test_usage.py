@@ -0,0 +1,69 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import override_settings
+from backend import tasks, usage
+from backend.models import FieldUsage, OperationUsage, Task
+from backend.tests.factories import make_listing
+from backend.tests.utils import GraphQLTestCase
+
+
+@override_settings(GRAPHQL_USAGE={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'FLUSH_INTERVAL': 0})
+class UsageTestCase(GraphQLTestCase):
+    def setUp(self):
+        usage.aggregate.drain()
+        make_listing(categories=['books'])
+
+    def tearDown(self):
+        usage.aggregate.drain()
+
+    def testAnalyze(self):
+        name, signature, fields = usage.analyze('''query Feed { listings(maxPrice: "20", categories: ["books"]) { ...Item }
+            user(id: 1) { email } }
+            fragment Item on ListingType { itemName user { bio } }''', 'Feed')
+        self.assertEqual(name, 'Feed')
+        self.assertEqual(signature, 'listings(categories,maxPrice) user(id)')
+        self.assertEqual(fields, {'Query.listings', 'Query.user', 'ListingType.itemName', 'ListingType.user',
+                                  'UserType.bio', 'UserType.email'})
+        self.assertIsNone(usage.analyze('not graphql'))
+
+    def testAnalyzeOnlyCountsTheSelectedOperation(self):
+        document = '''query Feed { listings { ...Item } }
+            query Profile { user(id: 1) { bio ...Seller } }
+            fragment Item on ListingType { itemName user { ...Seller } }
+            fragment Seller on UserType { email }
+            fragment Unused on ListingType { description }'''
+        name, signature, fields = usage.analyze(document, 'Feed')
+        self.assertEqual(fields, {'Query.listings', 'ListingType.itemName', 'ListingType.user', 'UserType.email'})
+        name, signature, fields = usage.analyze(document, 'Profile')
+        self.assertEqual(fields, {'Query.user', 'UserType.bio', 'UserType.email'})
+
+    def testRequestsAreRecorded(self):
+        self.graphql('query Feed { listings(categories: ["books"]) { itemName } }')
+        self.graphql('query Feed { listings(categories: ["books"]) { itemName description } }')
+        tasks.run_pending()
+        operation = OperationUsage.objects.get()
+        self.assertEqual((operation.operation_name, operation.signature, operation.count), ('Feed', 'listings(categories)', 2))
+        self.assertGreater(operation.total_queries, 0)
+        self.assertEqual(FieldUsage.objects.get(field='ListingType.itemName').count, 2)
+        self.assertEqual(FieldUsage.objects.get(field='ListingType.description').count, 1)
+
+    @override_settings(GRAPHQL_USAGE={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'FLUSH_INTERVAL': 3600})
+    def testAggregateIsQueuedAtExit(self):
+        self.graphql('{ listings { itemName } }')
+        self.assertFalse(Task.objects.exists())
+        usage.flush_at_exit()
+        tasks.run_pending()
+        self.assertEqual(OperationUsage.objects.get().count, 1)
+
+    def testReport(self):
+        self.graphql('{ listings(maxPrice: "20") { itemName } }')
+        self.graphql('{ listings { itemName } }')
+        tasks.run_pending()
+        report = usage.report()
+        self.assertEqual(report['arguments']['listings'], {'maxPrice': 1})
+        self.assertEqual(report['fields']['ListingType']['itemName'], 2)
+        self.assertEqual(report['fields']['ListingType']['description'], 0)
+        out = StringIO()
+        call_command('usage_report', '--type', 'ListingType', stdout=out)
+        self.assertIn("listings(maxPrice)", out.getvalue())
+        self.assertNotIn("UserType", out.getvalue())
@@ -0,0 +1,141 @@
+from datetime import timedelta
+from unittest import mock
+from django.db import DatabaseError
+from django.test import override_settings
+from django.utils import timezone
+from backend import auth, viewtracking
+from backend.caching import VIEW_STATS_VERSION, bump_data_version
+from backend.models import ListingStats, RecentView
+from backend.tests.factories import make_listing, make_user
+from backend.tests.utils import GraphQLTestCase
+
+
+@override_settings(VIEW_TRACKING={'ENABLED': True, 'FLUSH_INTERVAL': None, 'RECENT_LIMIT': 3})
+class ViewTrackingTestCase(GraphQLTestCase):
+    def setUp(self):
+        viewtracking.buffer.drain()
+        self.viewer = make_user()
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {auth.create_token(self.viewer)}'}
+
+    def tearDown(self):
+        viewtracking.buffer.drain()
+
+    def view(self, listing, times=1):
+        for _ in range(times):
+            self.graphql('{ listing(id: %d) { id } }' % listing.pk, headers=self.headers)
+
+    def testViewsAreBufferedThenFlushed(self):
+        listing = make_listing()
+        self.view(listing, 3)
+        self.assertFalse(ListingStats.objects.exists())
+        self.assertEqual(viewtracking.flush(), 3)
+        self.view(listing, 2)
+        viewtracking.flush()
+        self.assertEqual(ListingStats.objects.get().views, 5)
+
+    def testFlushIsBatched(self):
+        listings = [make_listing() for _ in range(5)]
+        for listing in listings:
+            self.view(listing, 2)
+        # the first bump creates the version row
+        bump_data_version(VIEW_STATS_VERSION)
+        with self.assertNumQueries(13):
+            # savepoint, listings, insert stats, stats, update stats, live listings, viewers,
+            # delete, insert and trim (2) recent views, version bump, release savepoint,
+            # whatever the number of views
+            viewtracking.flush()
+
+    def testFailedFlushKeepsViews(self):
+        listing = make_listing()
+        self.view(listing, 2)
+        with mock.patch.object(viewtracking, 'write', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                viewtracking.flush()
+        self.view(listing)
+        self.assertEqual(viewtracking.flush(), 3)
+        self.assertEqual(ListingStats.objects.get().views, 3)
+        self.assertEqual(RecentView.objects.get().listing, listing)
+
+    def testFlushKeepsRowsWrittenByAnotherWorker(self):
+        listing = make_listing()
+        self.view(listing, 2)
+        counts, recent = viewtracking.buffer.drain()
+        # another worker flushing the same listing and viewer in the meantime
+        ListingStats.objects.create(listing=listing, views=4, trend=viewtracking.add_views(None, 4, timezone.now(), 24))
+        RecentView.objects.create(user=self.viewer, listing=listing, viewed_at=timezone.now())
+        viewtracking.buffer.restore(counts, recent)
+        self.assertEqual(viewtracking.flush(), 2)
+        self.assertEqual(ListingStats.objects.get().views, 6)
+        self.assertEqual(RecentView.objects.count(), 1)
+
+    def testFlushInvalidatesViewStatsETags(self):
+        listing = make_listing()
+        trending = {'query': '{ trendingListings { id } }'}
+        other = {'query': '{ listings { id } }'}
+        get = lambda params, **headers: self.client.get('/graphql/', params, HTTP_ACCEPT='application/json', **headers)
+        etags = [get(trending)['ETag'], get(other)['ETag']]
+        self.view(listing)
+        viewtracking.flush()
+        response = get(trending, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['trendingListings'], [{'id': str(listing.pk)}])
+        # the other queries stay cached
+        self.assertEqual(get(other, HTTP_IF_NONE_MATCH=etags[1]).status_code, 304)
+
+    def testTrendingDecays(self):
+        old, new = make_listing(), make_listing()
+        self.assertGreater(
+            viewtracking.add_views(None, 1, timezone.now(), 24),
+            viewtracking.add_views(None, 1, timezone.now() - timedelta(hours=25), 24) + 0.69,
+        )
+        self.view(old, 3)
+        viewtracking.flush()
+        self.view(new, 2)
+        viewtracking.flush()
+        # 3 views a day ago count less than 2 views now
+        ListingStats.objects.filter(listing=old).update(
+            trend=viewtracking.add_views(None, 3, timezone.now() - timedelta(hours=24), 24)
+        )
+        trending = self.graphql('{ trendingListings { id } }')['trendingListings']
+        self.assertEqual([int(listing['id']) for listing in trending], [new.pk, old.pk])
+
+    def testTrendingByUniversity(self):
+        tamu = make_listing(make_user(university="TAMU"))
+        ut = make_listing(make_user(university="UT"))
+        self.view(tamu)
+        self.view(ut)
+        viewtracking.flush()
+        trending = self.graphql('{ trendingListings(university: "tamu") { id } }')['trendingListings']
+        self.assertEqual(trending, [{'id': str(tamu.pk)}])
+
+    def testFirstIsClamped(self):
+        listing = make_listing()
+        self.view(listing)
+        viewtracking.flush()
+        query = 'query ($first: Int) { trendingListings(first: $first) { id } user(id: %d) { recentlyViewed(first: $first) { id } } }'
+        self.assertEqual(self.graphql(query % self.viewer.pk, variables={'first': -1}),
+            {'trendingListings': [], 'user': {'recentlyViewed': []}})
+        self.assertEqual(self.graphql(query % self.viewer.pk, variables={'first': None}),
+            {'trendingListings': [{'id': str(listing.pk)}], 'user': {'recentlyViewed': [{'id': str(listing.pk)}]}})
+
+    def testRecentlyViewedIsBounded(self):
+        listings = [make_listing() for _ in range(5)]
+        for listing in listings:
+            self.view(listing)
+            viewtracking.flush()
+        self.view(listings[0])
+        viewtracking.flush()
+        self.assertEqual(RecentView.objects.filter(user=self.viewer).count(), 3)
+        result = self.graphql('{ user(id: %d) { recentlyViewed { id } } }' % self.viewer.pk)
+        self.assertEqual(
+            [int(listing['id']) for listing in result['user']['recentlyViewed']],
+            [listings[0].pk, listings[4].pk, listings[3].pk],
+        )
+
+    def testBufferIsBounded(self):
+        buffer = viewtracking.ViewBuffer(max_size=2)
+        now = timezone.now()
+        for listing_id in (1, 2, 3, 1):
+            buffer.add(listing_id, None, now)
+        self.assertEqual(buffer.counts, {1: 2, 2: 1})
+        self.assertEqual(buffer.dropped, 1)
@@ -0,0 +1,58 @@
+'''
+Helpers to run GraphQL operations in tests and pin their number of SQL queries.
+'''
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+
+class GraphQLTestCase(TestCase):
+    '''
+    TestCase with:
+    - graphql(): run an operation through /graphql/ and return its data,
+      failing the test on GraphQL errors
+    - assertGraphQLQueries(): run an operation and check the exact number of
+      SQL queries it made, listing them when the count is off
+    - assertConstantGraphQLQueries(): check that the count doesn't grow with
+      the number of rows, i.e. that there is no N+1 query
+    '''
+
+    def execute(self, query, variables=None, headers=None):
+        data = {'query': query}
+        if variables is not None:
+            data['variables'] = variables
+        response = self.client.post('/graphql/', json.dumps(data), content_type='application/json', **(headers or {}))
+        return response.json()
+
+    def graphql(self, query, variables=None, headers=None):
+        result = self.execute(query, variables, headers)
+        self.assertNotIn('errors', result, result.get('errors'))
+        return result['data']
+
+    def captureGraphQLQueries(self, query, variables=None, headers=None):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.graphql(query, variables, headers)
+        return data, [query['sql'] for query in queries.captured_queries]
+
+    def assertGraphQLQueries(self, num, query, variables=None, headers=None):
+        ''' Run the operation, assert it made exactly `num` SQL queries and return its data. '''
+        data, queries = self.captureGraphQLQueries(query, variables, headers)
+        self.assertEqual(
+            len(queries), num,
+            f"{len(queries)} queries executed, {num} expected:\n" + '\n'.join(
+                f'{i}. {sql}' for i, sql in enumerate(queries, start=1)
+            ),
+        )
+        return data
+
+    def assertConstantGraphQLQueries(self, query, add_rows, variables=None, headers=None):
+        '''
+        Run the operation, call add_rows() to create more data, run it again
+        and assert both runs made the same number of queries. Returns that number.
+        '''
+        data, before = self.captureGraphQLQueries(query, variables, headers)
+        add_rows()
+        self.assertGraphQLQueries(len(before), query, variables, headers)
+        return len(before)
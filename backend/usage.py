@@ -0,0 +1,280 @@
+'''
+Field usage analytics of the GraphQL API.
+
+A sample (SAMPLE_RATE) of the requests is recorded by the GraphQL view:
+- the operation name and signature: the root fields with the names of the
+  arguments they were given, e.g. "listings(categories,maxPrice)"
+- every field selected, by type: "ListingType.description"
+- the request's latency and number of SQL queries
+
+Records are aggregated in memory per hour and handed every FLUSH_INTERVAL
+seconds (at the next sampled request) and when the process exits to the
+store_usage background task (see tasks.py), which adds them
+to the OperationUsage / FieldUsage rows. `python manage.py usage_report`
+reports the top signatures and the fields clients never select.
+'''
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from graphql import parse
+from graphql.error import GraphQLError
+from graphql.language import ast
+from graphql.language.visitor import TypeInfoVisitor, Visitor, visit
+from graphql.utils.type_info import TypeInfo
+
+from .models import FieldUsage, OperationUsage
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.05,
+    'FLUSH_INTERVAL': 60,
+    'RETENTION_DAYS': 30,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'GRAPHQL_USAGE', {}))
+    return config
+
+
+def should_sample():
+    config = get_config()
+    return config['ENABLED'] and random.random() < config['SAMPLE_RATE']
+
+
+class QueryCounter:
+    ''' connection.execute_wrapper() counting the SQL queries of a request. '''
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class FieldCollector(Visitor):
+    def __init__(self, type_info):
+        self.type_info = type_info
+        self.fields = set()
+
+    def enter_Field(self, node, *args):
+        parent = self.type_info.get_parent_type()
+        if parent is not None and not node.name.value.startswith('__'):
+            self.fields.add(f'{parent.name}.{node.name.value}')
+
+
+def signature(operation):
+    ''' "field(arg,arg) field" for the root fields of an operation, arguments sorted. '''
+    parts = []
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, ast.Field) or selection.name.value.startswith('__'):
+            continue
+        arguments = sorted(argument.name.value for argument in selection.arguments or [])
+        parts.append(selection.name.value + (f"({','.join(arguments)})" if arguments else ''))
+    return ' '.join(sorted(parts))
+
+
+def used_fragments(operation, fragments):
+    ''' The fragment definitions an operation spreads, directly or through other fragments. '''
+    used = {}
+    pending = [operation.selection_set]
+    while pending:
+        selection_set = pending.pop()
+        for selection in selection_set.selections if selection_set else []:
+            if isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                if name not in used and name in fragments:
+                    used[name] = fragments[name]
+                    pending.append(fragments[name].selection_set)
+            else:
+                pending.append(selection.selection_set)
+    return list(used.values())
+
+
+@lru_cache(maxsize=512)
+def analyze(query, operation_name=None):
+    '''
+    (operation name, signature, selected fields) of the operation of a GraphQL
+    document, None if it can't be parsed. Cached, clients send the same
+    documents over and over.
+    '''
+    from cbay.schema import get_schema
+
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return None
+    operations = [definition for definition in document.definitions if isinstance(definition, ast.OperationDefinition)]
+    if operation_name:
+        operations = [operation for operation in operations if operation.name and operation.name.value == operation_name]
+    if len(operations) != 1:
+        return None
+
+    operation = operations[0]
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions if isinstance(definition, ast.FragmentDefinition)
+    }
+    type_info = TypeInfo(get_schema())
+    collector = FieldCollector(type_info)
+    # only the operation that runs and the fragments it uses
+    for node in [operation] + used_fragments(operation, fragments):
+        visit(node, TypeInfoVisitor(type_info, collector))
+    operation_signature = signature(operation)
+    if not operation_signature:
+        return None
+    return operation.name.value if operation.name else '', operation_signature, frozenset(collector.fields)
+
+
+class Aggregate:
+    ''' In-process aggregate of the sampled requests, per hour. '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.operations = defaultdict(lambda: [0, 0.0, 0])
+        self.fields = defaultdict(int)
+        self.started = time.monotonic()
+
+    def add(self, hour, operation_name, operation_signature, fields, seconds, queries):
+        with self.lock:
+            totals = self.operations[(hour, operation_name, operation_signature)]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += queries
+            for field in fields:
+                self.fields[(hour, field)] += 1
+
+    def drain(self, older_than=None):
+        ''' The aggregated rows (JSON serializable), if the aggregate is older than `older_than` seconds. '''
+        with self.lock:
+            if older_than is not None and time.monotonic() - self.started < older_than:
+                return None
+            rows = {
+                'operations': [[*key, *totals] for key, totals in self.operations.items()],
+                'fields': [[*key, count] for key, count in self.fields.items()],
+            }
+            self.reset()
+        return rows
+
+
+aggregate = Aggregate()
+
+
+def record(query, operation_name, seconds, queries):
+    ''' Add a sampled request to the aggregate, and hand the aggregate to the worker when it is due. '''
+    analysis = analyze(query or '', operation_name or None)
+    if analysis is None:
+        return
+    operation_name, operation_signature, fields = analysis
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0).isoformat()
+    aggregate.add(hour, operation_name, operation_signature, fields, seconds, queries)
+
+    flush(older_than=get_config()['FLUSH_INTERVAL'])
+
+
+def flush(older_than=None):
+    ''' Queue the aggregate for the store_usage task, if it is older than `older_than` seconds. '''
+    rows = aggregate.drain(older_than)
+    if rows is not None and (rows['operations'] or rows['fields']):
+        store_usage.delay(rows)
+
+
+@atexit.register
+def flush_at_exit():
+    # don't lose the last interval when the process exits (or is recycled) normally
+    try:
+        flush()
+    except Exception:
+        logger.exception("queueing the GraphQL usage failed")
+
+
+@task()
+def store_usage(rows):
+    ''' Task: add aggregated rows to the usage tables, and drop the rows past retention. '''
+    for hour, operation_name, operation_signature, count, seconds, queries in rows['operations']:
+        with transaction.atomic():
+            usage, created = OperationUsage.objects.select_for_update().get_or_create(
+                hour=parse_datetime(hour), operation_name=operation_name[:100], signature=operation_signature[:500]
+            )
+            OperationUsage.objects.filter(pk=usage.pk).update(
+                count=F('count') + count, total_seconds=F('total_seconds') + seconds, total_queries=F('total_queries') + queries
+            )
+    for hour, field, count in rows['fields']:
+        with transaction.atomic():
+            usage, created = FieldUsage.objects.select_for_update().get_or_create(hour=parse_datetime(hour), field=field)
+            FieldUsage.objects.filter(pk=usage.pk).update(count=F('count') + count)
+
+    cutoff = timezone.now() - timedelta(days=get_config()['RETENTION_DAYS'])
+    OperationUsage.objects.filter(hour__lt=cutoff).delete()
+    FieldUsage.objects.filter(hour__lt=cutoff).delete()
+
+
+def report(days=7):
+    '''
+    Usage over the last `days` days:
+    - operations: (operation name, signature, count, average ms, average SQL queries), most used first
+    - arguments: {root field: {argument: number of requests using it}}
+    - fields: {object type: {field: count}}, with every field of the schema (0 = never selected)
+    '''
+    from graphql.type import GraphQLObjectType
+    from cbay.schema import get_schema
+
+    since = timezone.now() - timedelta(days=days)
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for operation_name, operation_signature, count, seconds, queries in (
+        OperationUsage.objects.filter(hour__gte=since)
+            .values_list('operation_name', 'signature', 'count', 'total_seconds', 'total_queries')
+    ):
+        total = totals[(operation_name, operation_signature)]
+        total[0] += count
+        total[1] += seconds
+        total[2] += queries
+    operations = sorted(
+        (
+            (operation_name, operation_signature, count, 1000 * seconds / count, queries / count)
+            for (operation_name, operation_signature), (count, seconds, queries) in totals.items()
+        ),
+        key=lambda row: -row[2],
+    )
+
+    arguments = defaultdict(lambda: defaultdict(int))
+    for operation_name, operation_signature, count, ms, queries in operations:
+        for part in operation_signature.split(' '):
+            field, _, names = part.partition('(')
+            arguments[field]
+            for name in filter(None, names.rstrip(')').split(',')):
+                arguments[field][name] += count
+
+    fields = {}
+    for name, graphql_type in get_schema().get_type_map().items():
+        if isinstance(graphql_type, GraphQLObjectType) and not name.startswith('__'):
+            fields[name] = {field: 0 for field in graphql_type.fields}
+    for field, count in FieldUsage.objects.filter(hour__gte=since).values_list('field', 'count'):
+        type_name, _, field_name = field.partition('.')
+        if type_name in fields:
+            fields[type_name][field_name] = fields[type_name].get(field_name, 0) + count
+
+    return {
+        'operations': operations,
+        'arguments': {field: dict(counts) for field, counts in arguments.items()},
+        'fields': fields,
+    }
@@ -1,3 +1,119 @@
-from django.shortcuts import render
+import json
+import math
+import time
 
-# Create your views here.
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError
+
+from . import ratelimit, usage
+from .caching import VIEW_STATS_VERSION, compute_etag, get_cache_control, get_data_version, uses_view_stats
+
+
+class GraphQLView(BaseGraphQLView):
+    '''
+    GraphQL endpoint with rate limiting and HTTP caching for GET queries.
+
+    Every request is charged against the client's token bucket (see ratelimit)
+    and gets a 429 with a Retry-After header when the bucket is empty.
+
+    Queries sent with GET get an ETag computed from the data version and the
+    request parameters, and a Cache-Control header (see caching.get_cache_control).
+    A request whose If-None-Match matches the current ETag gets a 304 without
+    running the query. POST requests are handled as before.
+
+    A sample of the requests is recorded for the field usage analytics (see usage).
+    '''
+
+    def dispatch(self, request, *args, **kwargs):
+        config = ratelimit.get_config()
+        if not config['ENABLED']:
+            return self.recorded_dispatch(request, *args, **kwargs)
+
+        # a query costing more than the whole bucket could never run
+        data = self.get_data(request)
+        cost = min(
+            ratelimit.operation_cost(data.get('query') or '', config['COSTS'], data.get('operationName')),
+            config['BURST'],
+        )
+        allowed, remaining, retry_after = ratelimit.get_backend(config).consume(
+            ratelimit.client_key(request, config),
+            cost,
+            config['RATE'],
+            config['BURST'],
+        )
+        if allowed:
+            response = self.recorded_dispatch(request, *args, **kwargs)
+        else:
+            response = HttpResponse(
+                json.dumps({'errors': [{'message': "Rate limit exceeded, slow down."}]}),
+                status=429,
+                content_type='application/json',
+            )
+            response['Retry-After'] = str(math.ceil(retry_after))
+
+        response['X-RateLimit-Limit'] = str(config['BURST'])
+        response['X-RateLimit-Remaining'] = str(math.floor(remaining))
+        return response
+
+    def recorded_dispatch(self, request, *args, **kwargs):
+        if not usage.should_sample():
+            return self.cached_dispatch(request, *args, **kwargs)
+
+        counter = usage.QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.cached_dispatch(request, *args, **kwargs)
+        data = self.get_data(request)
+        usage.record(data.get('query'), data.get('operationName'), time.perf_counter() - start, counter.count)
+        return response
+
+    def cached_dispatch(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        operation_name = request.GET.get('operationName')
+        version = get_data_version()
+        if uses_view_stats(request.GET.get('query')):
+            version = [version, get_data_version(VIEW_STATS_VERSION)]
+        etag = compute_etag(
+            version,
+            request.GET.get('query'),
+            request.GET.get('variables'),
+            operation_name,
+            getattr(request, 'cbay_user_id', None),
+        )
+        cache_control = get_cache_control(operation_name)
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
+    def is_cacheable(self, request):
+        # Only GET queries. GraphiQL pages and mutations (which graphene
+        # rejects over GET anyway) are left alone.
+        if request.method != 'GET' or not request.GET.get('query'):
+            return False
+        return not (self.graphiql and self.can_display_graphiql(request, {}))
+
+    def get_data(self, request):
+        ''' The GraphQL parameters (query, operationName, ...) of the request, {} if they can't be parsed. '''
+        if request.method == 'GET':
+            return request.GET
+        try:
+            data = self.parse_body(request)
+        except HttpError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return data
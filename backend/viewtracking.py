@@ -0,0 +1,269 @@
+'''
+View counts, trending listings and recently viewed listings.
+
+Fetching a listing (the listing(id) query) only records the view in an
+in-process buffer: a counter per listing and the last (user, listing) views.
+The buffer is flushed to ListingStats / RecentView in one batch every
+FLUSH_INTERVAL seconds by a background thread (or when it gets half full),
+so N views of a listing cost one UPDATE instead of N INSERTs. The buffer is
+bounded (MAX_BUFFERED keys); views of new listings are dropped while it is full.
+Views of a failed flush go back to the buffer.
+
+Trending score: every view counts exp(-age / tau) with tau = HALF_LIFE / ln 2.
+Decaying all the scores over time would need to rewrite every row, so
+ListingStats.trend stores instead
+
+    trend = log(sum over views of exp(t_view / tau))
+
+(t in hours since EPOCH), which only changes when a listing is viewed and
+ranks the listings exactly like the decayed score at any time.
+'''
+import atexit
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import VIEW_STATS_VERSION, bump_data_version
+from .models import Listing, ListingStats, RecentView, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    # seconds between flushes, None to only flush when flush() is called
+    'FLUSH_INTERVAL': 10,
+    'MAX_BUFFERED': 10000,
+    'HALF_LIFE_HOURS': 24,
+    'RECENT_LIMIT': 20,
+}
+
+EPOCH = datetime(2021, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'VIEW_TRACKING', {}))
+    return config
+
+
+def hours_since_epoch(when) -> float:
+    return (when - EPOCH).total_seconds() / 3600
+
+
+def add_views(trend, count, when, half_life_hours):
+    ''' trend after `count` more views at `when` (trend is None for a listing without views). '''
+    tau = half_life_hours / math.log(2)
+    added = math.log(count) + hours_since_epoch(when) / tau
+    if trend is None:
+        return added
+    # log(exp(trend) + exp(added)) without overflowing
+    high, low = max(trend, added), min(trend, added)
+    return high + math.log1p(math.exp(low - high))
+
+
+def normalize_university(university):
+    return (university or '').strip().lower()
+
+
+class ViewBuffer:
+    ''' Thread safe, bounded buffer of the views since the last flush. '''
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.recent = OrderedDict()
+        self.dropped = 0
+
+    def add(self, listing_id, user_id, when):
+        ''' Record a view. Returns True when the buffer is half full and should be flushed. '''
+        with self.lock:
+            if listing_id in self.counts or len(self.counts) < self.max_size:
+                self.counts[listing_id] = self.counts.get(listing_id, 0) + 1
+            else:
+                self.dropped += 1
+            if user_id is not None:
+                key = (user_id, listing_id)
+                self.recent.pop(key, None)
+                self.recent[key] = when
+                if len(self.recent) > self.max_size:
+                    # forget the oldest view
+                    self.recent.popitem(last=False)
+            return max(len(self.counts), len(self.recent)) >= self.max_size // 2
+
+    def drain(self):
+        ''' Take the buffered views, leaving the buffer empty. '''
+        with self.lock:
+            counts, recent = self.counts, self.recent
+            self.counts, self.recent = {}, OrderedDict()
+        return counts, recent
+
+    def restore(self, counts, recent):
+        ''' Put back drained views that could not be written (newer views win). '''
+        with self.lock:
+            for listing_id, count in counts.items():
+                if listing_id in self.counts or len(self.counts) < self.max_size:
+                    self.counts[listing_id] = self.counts.get(listing_id, 0) + count
+                else:
+                    self.dropped += count
+            newer = self.recent
+            self.recent = OrderedDict((key, when) for key, when in recent.items() if key not in newer)
+            self.recent.update(newer)
+            while len(self.recent) > self.max_size:
+                self.recent.popitem(last=False)
+
+    def __len__(self):
+        return len(self.counts) + len(self.recent)
+
+
+buffer = ViewBuffer(DEFAULTS['MAX_BUFFERED'])
+flusher = None
+
+
+class Flusher(threading.Thread):
+    ''' Daemon thread flushing the buffer every interval, or sooner when woken up. '''
+
+    def __init__(self, interval):
+        super().__init__(name='view-flusher', daemon=True)
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                flush()
+            except Exception:
+                logger.exception("flushing the listing views failed")
+            finally:
+                # the thread has its own connection, don't keep it open between flushes
+                connection.close()
+
+
+def ensure_flusher(interval):
+    # threads don't survive a fork (gunicorn preloads the app), so every
+    # worker process starts its own
+    global flusher
+    if flusher is None or flusher.pid != os.getpid():
+        flusher = Flusher(interval)
+        flusher.start()
+    return flusher
+
+
+def record_view(listing_id, user_id=None):
+    ''' Count a view of a listing, by `user_id` if the viewer is known. '''
+    config = get_config()
+    if not config['ENABLED']:
+        return
+    buffer.max_size = config['MAX_BUFFERED']
+    full = buffer.add(listing_id, user_id, timezone.now())
+    if config['FLUSH_INTERVAL'] is not None:
+        thread = ensure_flusher(config['FLUSH_INTERVAL'])
+        if full:
+            thread.wakeup.set()
+
+
+def flush():
+    '''
+    Write the buffered views: one row per viewed listing in ListingStats and
+    the recent views of each user, trimmed to RECENT_LIMIT. Returns the
+    number of views written. The views are put back in the buffer if
+    writing them fails, to be retried by the next flush.
+    '''
+    counts, recent = buffer.drain()
+    if not counts and not recent:
+        return 0
+    try:
+        write(counts, recent)
+    except Exception:
+        buffer.restore(counts, recent)
+        raise
+    return sum(counts.values())
+
+
+def write(counts, recent):
+    config = get_config()
+    now = timezone.now()
+
+    # every worker flushes on its own: rows another worker created in the
+    # meantime must neither fail the batch nor be overwritten
+    with transaction.atomic():
+        # listings deleted or archived since they were viewed are skipped
+        universities = dict(
+            Listing.objects.filter(pk__in=counts).values_list('pk', 'user__university')
+        )
+        # rows of the listings viewed for the first time, views=0 meaning no
+        # trend yet; left alone if they already exist
+        ListingStats.objects.bulk_create(
+            [ListingStats(listing_id=listing_id, views=0, trend=0.0) for listing_id in universities],
+            ignore_conflicts=True,
+        )
+        stats = ListingStats.objects.select_for_update().in_bulk(list(universities))
+        for listing_id, university in universities.items():
+            row = stats[listing_id]
+            row.trend = add_views(row.trend if row.views else None, counts[listing_id], now, config['HALF_LIFE_HOURS'])
+            row.views += counts[listing_id]
+            row.university = normalize_university(university)
+            row.last_viewed_at = now
+        ListingStats.objects.bulk_update(stats.values(), ['views', 'trend', 'university', 'last_viewed_at'])
+
+        if recent:
+            live = set(Listing.objects.filter(pk__in={listing_id for user_id, listing_id in recent}).values_list('pk', flat=True))
+            viewers = set(User.objects.filter(pk__in={user_id for user_id, listing_id in recent}).values_list('pk', flat=True))
+            recent = {key: when for key, when in recent.items() if key[0] in viewers and key[1] in live}
+            users = {user_id for user_id, listing_id in recent}
+            for user_id in users:
+                RecentView.objects.filter(
+                    user_id=user_id, listing_id__in=[listing_id for viewer, listing_id in recent if viewer == user_id]
+                ).delete()
+            # a view another worker wrote since the delete is just as recent
+            RecentView.objects.bulk_create([
+                RecentView(user_id=user_id, listing_id=listing_id, viewed_at=when)
+                for (user_id, listing_id), when in recent.items()
+            ], ignore_conflicts=True)
+            for user_id in users:
+                stale = RecentView.objects.filter(user_id=user_id).order_by('-viewed_at').values_list('pk', flat=True)[config['RECENT_LIMIT']:]
+                RecentView.objects.filter(pk__in=list(stale)).delete()
+
+        # trendingListings / recentlyViewed changed (see caching.py)
+        bump_data_version(VIEW_STATS_VERSION)
+
+
+def trending(university=None, first=20):
+    ''' Unsold listings with the highest trending score, of a university if given. '''
+    first = max(first if first is not None else 20, 0)
+    stats = ListingStats.objects.filter(listing__sold=False, listing__deleted_at__isnull=True)
+    if university is not None:
+        stats = stats.filter(university=normalize_university(university))
+    return [stat.listing for stat in stats.select_related('listing').order_by('-trend')[:first]]
+
+
+def recently_viewed(user_id, first=None):
+    ''' The listings a user viewed last, most recent first. '''
+    config = get_config()
+    first = max(min(first if first is not None else config['RECENT_LIMIT'], config['RECENT_LIMIT']), 0)
+    views = (
+        RecentView.objects.filter(user_id=user_id, listing__deleted_at__isnull=True)
+            .select_related('listing')
+            .order_by('-viewed_at')[:first]
+    )
+    return [view.listing for view in views]
+
+
+@atexit.register
+def flush_at_exit():
+    # don't lose the buffered views when the process exits normally
+    if len(buffer):
+        try:
+            flush()
+        except Exception:
+            logger.exception("flushing the listing views failed")
@@ -0,0 +1,86 @@
+'''
+PostgreSQL backend that checks connections out of a bounded per-process pool
+instead of opening (and keeping) one connection per thread.
+
+Configured through the POOL key of the database settings:
+
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': 10,         # max connections per process
+        'TIMEOUT': 30,          # seconds to wait for a free connection
+        'PRE_PING': True,       # run SELECT 1 before handing out an idle connection
+        'MAX_LIFETIME': 1800,   # recycle connections older than this (seconds)
+    }
+
+CONN_MAX_AGE should be 0 so that Django gives the connection back to the pool
+at the end of every request.
+'''
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from django.db.backends.postgresql import base
+
+from .pool import ConnectionPool, get_pool
+
+
+def _connect(conn_params):
+    connection = psycopg2.connect(**conn_params)
+    # Same as the stock backend, avoid a decode round trip for JSONField
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+def _ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if not connection.autocommit:
+        connection.rollback()
+
+
+def _reset(connection):
+    if connection.closed:
+        return False
+    if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_pool(self, conn_params=None):
+        options = self.settings_dict.get('POOL', {})
+
+        def create():
+            params = conn_params if conn_params is not None else self.get_connection_params()
+            return ConnectionPool(
+                connect=lambda: _connect(params),
+                ping=_ping,
+                reset=_reset,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 30),
+                pre_ping=options.get('PRE_PING', True),
+                max_lifetime=options.get('MAX_LIFETIME'),
+            )
+
+        return get_pool(self.alias, create)
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).checkout()
+
+        # Same isolation level handling as the stock backend
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # A connection closed in the middle of an atomic block is still
+                # referenced by Django until the block exits, so it must never
+                # go back to the pool where another thread could pick it up.
+                self.get_pool().checkin(self.connection, discard=self.in_atomic_block)
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    ''' Raised when no connection could be checked out within the pool timeout. '''
+    pass
+
+
+class ConnectionPool:
+    '''
+    A bounded, thread-safe pool of DB-API connections.
+
+    The pool never holds more than `max_size` connections (idle + in use).
+    When it is exhausted, `checkout()` waits up to `timeout` seconds for a
+    connection to be returned before raising PoolTimeout.
+
+    The pool itself does not know anything about the database driver, it is
+    given three callables:
+    1. connect(): open a new raw connection
+    2. ping(connection): raise if the connection is dead (used for pre-ping)
+    3. reset(connection): prepare a returned connection for reuse, return
+       False if the connection should be thrown away instead
+    '''
+
+    def __init__(self, connect, ping=None, reset=None, max_size=10, timeout=30.0,
+                 pre_ping=True, max_lifetime=None):
+        self.connect = connect
+        self.ping = ping
+        self.reset = reset
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.max_lifetime = max_lifetime
+
+        # the pool belongs to the process that created it. A forked
+        # child must not reuse the sockets of its parent.
+        self.pid = os.getpid()
+
+        self._condition = threading.Condition()
+        # idle connections as (connection, created_at) pairs, newest last
+        self._idle = []
+        # creation time of every checked out connection, keyed by id()
+        self._in_use = {}
+        self._size = 0
+
+        # metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._ping_failures = 0
+
+    # ---------- checkout / checkin ----------
+    def checkout(self):
+        ''' Return a healthy connection, opening a new one if there is room. '''
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Could not get a database connection within {self.timeout}s "
+                            f"(pool size {self.max_size})."
+                        )
+                    if not waited:
+                        waited = True
+                        self._waits += 1
+                        wait_started = time.monotonic()
+                    self._condition.wait(remaining)
+
+                if waited:
+                    self._wait_time += time.monotonic() - wait_started
+                    waited = False
+
+                if self._idle:
+                    connection, created_at = self._idle.pop()
+                else:
+                    # reserve a slot, the connection is opened outside the lock
+                    self._size += 1
+                    connection, created_at = None, None
+
+            if connection is None:
+                try:
+                    connection = self.connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                created_at = time.monotonic()
+                with self._condition:
+                    self._created += 1
+            elif self._expired(created_at) or not self._healthy(connection):
+                self._discard(connection)
+                continue
+
+            with self._condition:
+                self._checkouts += 1
+                self._in_use[id(connection)] = created_at
+            return connection
+
+    def checkin(self, connection, discard=False):
+        ''' Give a connection back to the pool. '''
+        with self._condition:
+            created_at = self._in_use.pop(id(connection), None)
+
+        if created_at is None:
+            # not one of ours (or checked out before a fork), just close it
+            self._close(connection)
+            return
+
+        if discard or self._expired(created_at) or not self._reusable(connection):
+            self._discard(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, created_at))
+            self._condition.notify()
+
+    def close_all(self):
+        ''' Close every idle connection. Checked out connections are closed on checkin. '''
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._discarded += len(idle)
+            self._condition.notify_all()
+        for connection, created_at in idle:
+            self._close(connection)
+
+    def stats(self):
+        ''' Return a snapshot of the pool metrics. '''
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'ping_failures': self._ping_failures,
+            }
+
+    # ---------- helpers ----------
+    def _expired(self, created_at):
+        return self.max_lifetime is not None and time.monotonic() - created_at > self.max_lifetime
+
+    def _healthy(self, connection):
+        if not self.pre_ping or self.ping is None:
+            return True
+        try:
+            self.ping(connection)
+        except Exception:
+            with self._condition:
+                self._ping_failures += 1
+            return False
+        return True
+
+    def _reusable(self, connection):
+        if self.reset is None:
+            return True
+        try:
+            return bool(self.reset(connection))
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        self._close(connection)
+        with self._condition:
+            self._discarded += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+# One pool per database alias, per process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, create):
+    '''
+    Return the pool for the given alias, calling create() to build it the
+    first time. Pools inherited from a parent process through fork() are
+    dropped (without closing the parent's sockets) and rebuilt.
+    '''
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = create()
+        return pool
+
+
+def pool_stats():
+    ''' Metrics for every pool of the current process, keyed by alias. '''
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items() if pool.pid == os.getpid()}
+
+
+def close_pools():
+    ''' Close the idle connections of every pool of the current process. '''
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        if pool.pid == os.getpid():
+            pool.close_all()
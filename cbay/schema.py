@@ -1,16 +1,32 @@
+import functools
+
 import graphene
-import backend.schema
 
-class Query(backend.schema.Query, graphene.ObjectType):
-    # This is a dummy class. Its only role is to inherit Query classes
-    # of all the apps in the project. Currently, our only app is 
-    # "backend" so it is only inheriting one Query class.
-    pass
 
-class Mutation(backend.schema.Mutation, graphene.ObjectType):
-    # This is a dummy class. Its only role is to inherit Mutation classes
-    # of all the apps in the project. Currently, our only app is 
-    # "backend" so it is only inheriting one Mutation class.
-    pass
+# The schema is built on first use rather than at import time, so that
+# management commands (and the URLconf) don't pay for building every
+# GraphQL type. `manage.py serve` builds it once before forking.
+@functools.lru_cache(maxsize=None)
+def get_schema():
+    import backend.schema
+
+    class Query(backend.schema.Query, graphene.ObjectType):
+        # This is a dummy class. Its only role is to inherit Query classes
+        # of all the apps in the project. Currently, our only app is
+        # "backend" so it is only inheriting one Query class.
+        pass
+
+    class Mutation(backend.schema.Mutation, graphene.ObjectType):
+        # This is a dummy class. Its only role is to inherit Mutation classes
+        # of all the apps in the project. Currently, our only app is
+        # "backend" so it is only inheriting one Mutation class.
+        pass
+
+    return graphene.Schema(query=Query, mutation=Mutation)
+
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+def __getattr__(name):
+    # Keeps `cbay.schema.schema` (used by the GRAPHENE setting) working
+    if name == 'schema':
+        return get_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -34,7 +34,9 @@ except FileNotFoundError:
 
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Off unless DJANGO_DEBUG=True (for local development), so the worker and the
+# scheduled commands don't log every query. `manage.py serve` always turns it off.
+DEBUG = os.environ.get('DJANGO_DEBUG', 'False') == 'True'
 
 ALLOWED_HOSTS = ["c-bay.herokuapp.com"]
 
@@ -58,15 +60,59 @@ GRAPHENE = {
     'SCHEMA': 'cbay.schema.schema'
 }
 
+# Cache-Control header of GET queries, per operation name.
+# Every GET query gets an ETag, `no-cache` means caches must revalidate it.
+GRAPHQL_CACHE_CONTROL = {
+    'DEFAULT': 'no-cache',
+    'OPERATIONS': {},
+}
+
+# Token bucket rate limiting of /graphql/ (see backend/ratelimit.py).
+# Use the 'cache' backend to share the buckets between processes.
+GRAPHQL_RATE_LIMIT = {
+    'ENABLED': os.environ.get('RATE_LIMIT', 'True') == 'True',
+    'BACKEND': os.environ.get('RATE_LIMIT_BACKEND', 'memory'),
+    'RATE': 20,
+    'BURST': 200,
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# The session, auth and message middleware are skipped on these routes,
+# which authenticate with signed tokens instead (see backend/auth.py).
+API_PATH_PREFIXES = ['/graphql/']
+AUTH_TOKEN_MAX_AGE = int(os.environ.get('AUTH_TOKEN_MAX_AGE', 7 * 24 * 3600))
+
+# Sampled recording of the operations, arguments and fields clients use
+# (see backend/usage.py and the usage_report command).
+GRAPHQL_USAGE = {
+    'ENABLED': os.environ.get('GRAPHQL_USAGE', 'True') == 'True',
+    'SAMPLE_RATE': float(os.environ.get('GRAPHQL_USAGE_SAMPLE_RATE', 0.05)),
+    'FLUSH_INTERVAL': 60,
+    'RETENTION_DAYS': 30,
+}
+
+# View counts and trending listings (see backend/viewtracking.py). Views are
+# buffered in each process and written every FLUSH_INTERVAL seconds.
+VIEW_TRACKING = {
+    'ENABLED': os.environ.get('VIEW_TRACKING', 'True') == 'True',
+    'FLUSH_INTERVAL': 10,
+    'MAX_BUFFERED': 10000,
+    'HALF_LIFE_HOURS': 24,
+    'RECENT_LIMIT': 20,
+}
+
 MIDDLEWARE = [
+    # first, so the responses of the other middleware (e.g. the 401 of
+    # TokenAuthenticationMiddleware) get the CORS headers too
+    'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'backend.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'backend.middleware.AuthenticationMiddleware',
+    'backend.middleware.TokenAuthenticationMiddleware',
+    'backend.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'corsheaders.middleware.CorsMiddleware', 
 ]
 
 # If this is used then `CORS_ORIGIN_WHITELIST` will not have any effect
@@ -114,6 +160,30 @@ DATABASES = {
 
 DATABASES['default'] = dj_database_url.config(conn_max_age=600, ssl_require=True)
 
+# Connection pooling for the default database (Postgres only).
+# With DB_POOL=True every process keeps a bounded pool of connections shared
+# by all of its threads, instead of one persistent connection per thread.
+# Django hands the connection back to the pool at the end of each request.
+if os.environ.get('DB_POOL', 'False') == 'True':
+    DATABASES['default']['ENGINE'] = 'cbay.backends.postgresql_pool'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'PRE_PING': os.environ.get('DB_POOL_PRE_PING', 'True') == 'True',
+        'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+    }
+
+# Shared by every process (and dyno), unlike the default per-process
+# LocMemCache: the 'cache' rate limit backend relies on it. The table is
+# created by the backend 0018_cache_table migration.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cbay_cache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -0,0 +1,38 @@
+'''
+Settings for the test suite: `python manage.py test` uses them by default.
+
+The tests run on an in-memory SQLite database, in parallel on every core
+(see backend/tests/runner.py), with the rate limit, the view tracking and
+the usage analytics turned off.
+'''
+from .settings import *
+
+SECRET_KEY = SECRET_KEY or 'insecure-test-key'
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# fast hashing for the admin users created by the tests
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# the rate limit tests turn it back on with override_settings
+GRAPHQL_RATE_LIMIT = dict(GRAPHQL_RATE_LIMIT, ENABLED=False)
+
+# the view tracking tests turn it back on and flush by hand
+VIEW_TRACKING = dict(VIEW_TRACKING, ENABLED=False, FLUSH_INTERVAL=None)
+
+# the usage analytics tests sample every request
+GRAPHQL_USAGE = dict(GRAPHQL_USAGE, ENABLED=False)
+
+TEST_RUNNER = 'backend.tests.runner.ParallelTestRunner'
@@ -0,0 +1,76 @@
+'''
+Measure how long a fresh process takes to become ready to serve requests.
+
+The measurement runs in a new interpreter (started with `-X importtime`) so
+that nothing imported by the caller skews the numbers.
+'''
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+
+# Runs in the child process. Prints one JSON line with the phase timings.
+_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+import cbay.urls
+urls_done = time.perf_counter()
+schema_imported_by_urls = 'backend.schema' in sys.modules
+from cbay.schema import get_schema
+get_schema()
+schema_done = time.perf_counter()
+print(json.dumps({
+    'django_setup': setup_done - started,
+    'urlconf_import': urls_done - setup_done,
+    'schema_build': schema_done - urls_done,
+    'total': schema_done - started,
+    'schema_imported_by_urls': schema_imported_by_urls,
+}))
+'''
+
+
+def parse_importtime(output):
+    '''
+    Parse the stderr of `python -X importtime` into a list of
+    (module, self seconds, cumulative seconds).
+    '''
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            modules.append((module.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+        except ValueError:
+            # the header line ("self [us] | cumulative | imported package")
+            continue
+    return modules
+
+
+def measure_startup():
+    '''
+    Start a new interpreter, set up Django, import the URLconf and build the
+    GraphQL schema. Returns a dict with the phase timings (seconds), the
+    imported modules and the self import time per top level package.
+    '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+
+    packages = defaultdict(float)
+    for module, self_time, cumulative in modules:
+        packages[module.split('.')[0]] += self_time
+
+    report['modules'] = modules
+    report['packages'] = dict(packages)
+    return report
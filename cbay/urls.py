@@ -15,8 +15,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
-from cbay.schema import schema
+from backend.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
 urlpatterns = [
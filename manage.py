@@ -6,6 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
+    if sys.argv[1:2] == ['test']:
+        # in-memory database and parallel runner, see cbay/settings_test.py
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cbay.settings_test')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cbay.settings')
     try:
         from django.core.management import execute_from_command_line